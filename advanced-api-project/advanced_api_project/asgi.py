@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+# persistent connections leak under ASGI (see db.py); Django's docs say to
+# disable them there and rely on the backend's pool instead
+os.environ['DATABASE_CONN_MAX_AGE'] = '0'
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_api_project.settings')
 
 application = get_asgi_application()
@@ -0,0 +1,250 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware (first in MIDDLEWARE) measures every request:
+
+    total   wall time until the response is returned (for streaming
+            responses: until the headers; the log line covers the stream)
+    db      time spent in SQL, with the query count
+    dup     queries repeated with identical SQL and parameters
+    render  template / DRF renderer time (TemplateResponse and DRF Response;
+            templates rendered eagerly with render() count as app time)
+    app     everything else
+
+and reports them in a `Server-Timing` header (visible in the browser's
+network panel) and one JSON log line on the `perf` logger.
+
+Requests picked by the sampling rate, and requests slower than the slow
+threshold, also log their query list. In sampled requests each query
+carries its origin (the innermost frame in this project's code) and the
+project part of the stack. Finding the origin walks the stack on every
+query, so other requests skip it unless QUERY_ORIGINS is on, and their
+slow-request logs list the SQL only. Streaming responses are judged slow
+by their time to the headers, so long-lived streams (server-sent events,
+exports) are not logged as slow requests.
+
+Configuration: PERF_MIDDLEWARE = {...} in settings, defaulting to the
+PERF_SAMPLE_RATE, PERF_SLOW_REQUEST_MS, PERF_SERVER_TIMING and
+PERF_QUERY_ORIGINS environment variables (0.0, 500, 1 and 0).
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('perf')
+
+MAX_LOGGED_QUERIES = 200
+
+
+def perf_settings():
+    options = {
+        'SAMPLE_RATE': float(os.environ.get('PERF_SAMPLE_RATE', 0.0)),
+        'SLOW_REQUEST_MS': float(os.environ.get('PERF_SLOW_REQUEST_MS', 500)),
+        'SERVER_TIMING': os.environ.get('PERF_SERVER_TIMING', '1') == '1',
+        'QUERY_ORIGINS': os.environ.get('PERF_QUERY_ORIGINS', '0') == '1',
+    }
+    options.update(getattr(settings, 'PERF_MIDDLEWARE', {}))
+    return options
+
+
+def _is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename != __file__
+    )
+
+
+def _origin():
+    """'path:line in function' of the innermost project frame issuing the query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if _is_project_file(frame.f_code.co_filename):
+            filename = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def _project_stack():
+    return [
+        f'{os.path.relpath(entry.filename, settings.BASE_DIR)}:{entry.lineno} in {entry.name}'
+        for entry in traceback.extract_stack()
+        if _is_project_file(entry.filename)
+    ]
+
+
+class RequestRecorder:
+    def __init__(self, options, sampled):
+        self.options = options
+        self.sampled = sampled
+        self.origins = sampled or options['QUERY_ORIGINS']
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, params, seconds, origin, stack)
+        self.render_started = None
+        self.render_time = 0.0
+        self.response_time = None  # until the response (headers) was returned
+        self.total_time = None     # until the last streamed chunk
+
+    def __call__(self, execute, sql, params, many, context):
+        origin = _origin() if self.origins else None
+        stack = _project_stack() if self.sampled else None
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - started, origin, stack))
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield
+
+    def render_done(self, response):
+        if self.render_started is not None:
+            self.render_time += time.perf_counter() - self.render_started
+            self.render_started = None
+
+    @property
+    def db_time(self):
+        return sum(seconds for _, _, seconds, _, _ in self.queries)
+
+    @property
+    def duplicates(self):
+        seen = {(sql, repr(params)) for sql, params, _, _, _ in self.queries}
+        return len(self.queries) - len(seen)
+
+    def server_timing(self):
+        total = self.response_time * 1000
+        db = self.db_time * 1000
+        render = self.render_time * 1000
+        return ', '.join([
+            f'total;dur={total:.1f}',
+            f'db;dur={db:.1f};desc="{len(self.queries)} queries"',
+            f'dup;desc="{self.duplicates} duplicate queries"',
+            f'render;dur={render:.1f}',
+            f'app;dur={max(total - db - render, 0.0):.1f}',
+        ])
+
+    def record(self, request, response):
+        total = (self.total_time or self.response_time) * 1000
+        db = self.db_time * 1000
+        render = self.render_time * 1000
+        waited = self.response_time * 1000 if response.streaming else total
+        slow = waited >= self.options['SLOW_REQUEST_MS']
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'total_ms': round(total, 2),
+            'db_ms': round(db, 2),
+            'queries': len(self.queries),
+            'duplicate_queries': self.duplicates,
+            'render_ms': round(render, 2),
+            'app_ms': round(max(total - db - render, 0.0), 2),
+            'sampled': self.sampled,
+            'slow': slow,
+        }
+        if self.sampled or slow:
+            entry['query_log'] = [
+                {'sql': sql, 'ms': round(seconds * 1000, 3), 'origin': origin, **({'stack': stack} if stack else {})}
+                for sql, _, seconds, origin, stack in self.queries[:MAX_LOGGED_QUERIES]
+            ]
+        return entry
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self._start(request)
+        with recorder.capture():
+            response = self.get_response(request)
+        return self._finish(request, recorder, response)
+
+    async def __acall__(self, request):
+        recorder = self._start(request)
+        with recorder.capture():
+            response = await self.get_response(request)
+        return self._finish(request, recorder, response)
+
+    def process_template_response(self, request, response):
+        recorder = getattr(request, '_perf_recorder', None)
+        if recorder is not None:
+            recorder.render_started = time.perf_counter()
+            response.add_post_render_callback(recorder.render_done)
+        return response
+
+    def _start(self, request):
+        options = perf_settings()
+        sample_rate = options['SAMPLE_RATE']
+        recorder = RequestRecorder(options, sampled=sample_rate > 0 and random.random() < sample_rate)
+        request._perf_recorder = recorder
+        return recorder
+
+    def _finish(self, request, recorder, response):
+        recorder.response_time = time.perf_counter() - recorder.started
+        if recorder.options['SERVER_TIMING']:
+            response['Server-Timing'] = recorder.server_timing()
+        if response.streaming:
+            # keep measuring while the body is produced; log once it is done
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = self._astream(request, recorder, response, content)
+            else:
+                response.streaming_content = self._stream(request, recorder, response, content)
+        else:
+            self._log(request, recorder, response)
+        return response
+
+    def _stream(self, request, recorder, response, content):
+        chunks = iter(content)
+        try:
+            while True:
+                with recorder.capture():
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            recorder.total_time = time.perf_counter() - recorder.started
+            self._log(request, recorder, response)
+
+    async def _astream(self, request, recorder, response, content):
+        chunks = aiter(content)
+        try:
+            while True:
+                with recorder.capture():
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            recorder.total_time = time.perf_counter() - recorder.started
+            self._log(request, recorder, response)
+
+    def _log(self, request, recorder, response):
+        entry = recorder.record(request, response)
+        level = logging.WARNING if entry['slow'] else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(entry, default=str), extra={'perf': entry})
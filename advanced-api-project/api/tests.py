@@ -1,3 +1,65 @@
 from django.test import TestCase
 
 # Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APITestCase
+
+from advanced_api_project.testing import QueryBudgetMixin
+from .models import Author, Book
+from .serializers import AuthorSerializer
+
+User = get_user_model()
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every books endpoint costs the same number of queries for 1 or 100 books."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='pass')
+        self.author = Author.objects.create(name='Dickens')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _books(self, n):
+        return Book.objects.bulk_create(
+            [Book(title=f'Book {i}', publication_year=1850 + i % 100, author=self.author) for i in range(n)]
+        )
+
+    def test_list(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.get('/api/books/'))
+
+    def test_list_filtered_searched_ordered(self):
+        # +1: django-filter validates ?author= by loading the Author
+        self.assertQueryBudget(2, self._books, lambda books: self.client.get(
+            f'/api/books/?author={self.author.pk}&search=Book&ordering=-publication_year'))
+
+    def test_detail(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.get(f'/api/books/{books[0].pk}/'))
+
+    def test_create(self):
+        self.assertQueryBudget(2, self._books, lambda books: self.client.post(
+            '/api/books/create/', {'title': 'New', 'publication_year': 1900, 'author': self.author.pk}))
+
+    def test_update(self):
+        self.assertQueryBudget(3, self._books, lambda books: self.client.put(
+            f'/api/books/{books[0].pk}/update/',
+            {'title': 'Renamed', 'publication_year': 1901, 'author': self.author.pk}))
+
+    def test_delete(self):
+        self.assertQueryBudget(2, self._books, lambda books: self.client.delete(f'/api/books/{books[0].pk}/delete/'))
+
+
+class AuthorSerializerQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """AuthorSerializer nests every book: it needs the books prefetched."""
+
+    def _authors(self, n):
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}') for i in range(n)])
+        Book.objects.bulk_create(
+            [Book(title=f'Book {i}', publication_year=1900, author=author)
+             for author in authors for i in range(3)]
+        )
+        return authors
+
+    def test_nested_books(self):
+        self.assertQueryBudget(2, self._authors, lambda authors: AuthorSerializer(
+            Author.objects.prefetch_related('books'), many=True).data)
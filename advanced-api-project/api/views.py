@@ -30,7 +30,7 @@ class BookListView(generics.ListAPIView):
 
     # fields exposed for simple filtering: ?title=...&author=...&publication_year=...
     filterset_fields = ['title', 'author', 'publication_year']
-    search_fields = ['title', 'author']   # adjust to real fields in Book
+    search_fields = ['title', 'author__name']   # author is a FK: search its name
     ordering_fields = ['title', 'publication_year', 'published_date', 'author', 'id']
     ordering = ['title']
 
@@ -7,6 +7,8 @@ Generated by 'django-admin startproject' using Django 5.2.5.
 import os
 from pathlib import Path
 
+from .db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'bookshelf.CustomUser'
 
 MIDDLEWARE = [
+    # outermost, so it times the whole stack (Server-Timing header + `perf` log)
+    'LibraryProject.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',  # must be near the top
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +56,19 @@ MIDDLEWARE = [
     'csp.middleware.CSPMiddleware',
 ]
 
+# One JSON line per request from LibraryProject.perf.PerformanceMiddleware on the
+# `perf` logger: WARNING logs slow requests only, INFO logs every request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'perf': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'LibraryProject.urls'
 
 TEMPLATES = [
@@ -72,11 +89,9 @@ TEMPLATES = [
 WSGI_APPLICATION = 'LibraryProject.wsgi.application'
 
 # Database (sqlite for dev, replace with Postgres/MySQL in production)
+# Connection settings come from the environment (sqlite by default); see db.py.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 # Password validation
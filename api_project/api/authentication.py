@@ -0,0 +1,124 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Bounded, thread-safe LRU cache of token key -> Token (with its user),
+    each entry expiring after `ttl` seconds.
+
+    The cache is per process: the signal handlers below evict entries
+    explicitly in the process that deletes a token or changes a user, and
+    the TTL bounds how stale any other process can be.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (token, expires_at)
+        self._keys_by_user = {}        # user id -> {key, ...}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, token):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (token, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(token.user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hit_rate': round(self.hits / total, 4) if total else None,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0].user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0].user_id]
+
+
+def _build_cache():
+    options = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+    return TokenCache(max_size=options.get('MAX_SIZE', 10000), ttl=options.get('TTL', 60))
+
+
+token_cache = _build_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for rest_framework's TokenAuthentication that skips
+    the token + user queries for recently seen tokens (see TokenCache).
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        # hand each request its own copy so view code cannot mutate the cached user
+        return (copy.copy(token.user), token)
+
+
+def _token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate_key(instance.key)
+
+
+def _user_saved(sender, instance, **kwargs):
+    # covers deactivation (is_active=False) as well as any other profile change
+    token_cache.invalidate_user(instance.pk)
+
+
+post_delete.connect(_token_deleted, sender=Token, dispatch_uid='cached_token_auth_token_deleted')
+post_save.connect(_user_saved, sender=get_user_model(), dispatch_uid='cached_token_auth_user_saved')
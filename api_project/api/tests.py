@@ -1,3 +1,54 @@
 from django.test import TestCase
 
 # Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api_project.testing import QueryBudgetMixin
+from .authentication import token_cache
+from .models import Book
+
+User = get_user_model()
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every books endpoint costs the same number of queries for 1 or 100 books."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def reset_query_budget_state(self):
+        super().reset_query_budget_state()
+        token_cache.clear()
+
+    def _books(self, n):
+        return Book.objects.bulk_create([Book(title=f'Book {i}', author=f'Author {i}') for i in range(n)])
+
+    def test_book_list(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.get('/api/books/'))
+
+    def test_viewset_list(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.get('/api/books_all/'))
+
+    def test_viewset_detail(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.get(f'/api/books_all/{books[0].pk}/'))
+
+    def test_viewset_create(self):
+        self.assertQueryBudget(1, self._books, lambda books: self.client.post(
+            '/api/books_all/', {'title': 'New', 'author': 'Someone'}))
+
+    def test_viewset_update(self):
+        self.assertQueryBudget(2, self._books, lambda books: self.client.put(
+            f'/api/books_all/{books[0].pk}/', {'title': 'Renamed', 'author': 'Someone'}))
+
+    def test_viewset_delete(self):
+        self.assertQueryBudget(2, self._books, lambda books: self.client.delete(f'/api/books_all/{books[0].pk}/'))
+
+    def test_token_authenticated_list(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertQueryBudget(2, self._books, lambda books: client.get('/api/books/'))
@@ -0,0 +1,92 @@
+"""
+Database profile for this project, configured from the environment.
+
+    DATABASE_ENGINE         sqlite (default) or postgres
+    DATABASE_NAME           sqlite file / postgres database name
+    DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT  (postgres)
+    DATABASE_CONN_MAX_AGE   seconds to keep a connection open between
+                            requests (default 60; 0 = one per request).
+                            Ignored under ASGI: asgi.py forces 0, since
+                            Django does not close persistent connections
+                            reliably there and they pile up
+    DATABASE_POOL           postgres only: 1 (default) uses psycopg's
+                            connection pool instead of persistent connections
+    DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE
+    SQLITE_BUSY_TIMEOUT     ms a writer waits for the lock (default 5000)
+    SQLITE_WAL              1 switches the database to WAL (default off)
+
+SQLite connections get the pragmas in SQLITE_PRAGMAS when they are opened
+(a busy timeout instead of immediate "database is locked", memory-mapped
+reads and a bigger page cache), and write transactions start with
+BEGIN IMMEDIATE so concurrent writers queue on busy_timeout instead of
+failing a lock upgrade.
+
+WAL (readers and the writer stop blocking each other, with relaxed fsync)
+is a deployment switch: journal_mode is stored in the database file, so
+applying it on every connection would rewrite the checked-in db.sqlite3
+on a bare `manage.py check`. Set SQLITE_WAL=1 where the database lives.
+"""
+import os
+
+from django.db.backends.signals import connection_created
+
+WAL_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',        # safe with WAL: only the last commits can be lost on power failure
+}
+
+SQLITE_PRAGMAS = {
+    **(WAL_PRAGMAS if os.environ.get('SQLITE_WAL', '') == '1' else {}),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # negative = KiB, i.e. 64 MiB
+    'temp_store': 'MEMORY',
+}
+
+
+def database_config(base_dir):
+    """The `DATABASES['default']` dict described by the environment."""
+    engine = os.environ.get('DATABASE_ENGINE', 'sqlite').lower()
+    conn_max_age = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+    if engine in ('postgres', 'postgresql'):
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', ''),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+        }
+        if os.environ.get('DATABASE_POOL', '1') == '1':
+            # requires psycopg[pool]; Django refuses persistent connections together with a pool
+            config['CONN_MAX_AGE'] = 0
+            config['OPTIONS'] = {'pool': {
+                'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            }}
+        return config
+
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_NAME', base_dir / 'db.sqlite3'),
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid='sqlite_pragmas')
@@ -0,0 +1,60 @@
+"""
+Query-budget assertions for API tests.
+
+    class PostListBudget(QueryBudgetMixin, APITestCase):
+        def test_post_list(self):
+            self.assertQueryBudget(
+                3,
+                build=lambda n: Post.objects.bulk_create(...n posts...),
+                request=lambda posts: self.client.get('/api/posts/posts/'),
+            )
+
+For each size in `budget_sizes` (1 and 100 by default) `build(n)` creates
+the data inside a savepoint, `request()` is measured, and the savepoint is
+rolled back before the next size. An unmeasured run at the smallest size
+goes first to warm per-process caches (ContentType and the like).
+
+The assertion fails if any size needs more than `budget` queries, or if
+the sizes need different numbers of queries, i.e. the endpoint's query
+count grows with its result size (an N+1). `build` may return a value;
+`request` then receives it.
+"""
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    budget_sizes = (1, 100)
+
+    def reset_query_budget_state(self):
+        """Called before each measurement; cached reads would hide queries."""
+        for cache in caches.all():
+            cache.clear()
+
+    def measure_queries(self, build, request, size, using=DEFAULT_DB_ALIAS):
+        """Run one size; returns (response, captured queries)."""
+        connection = connections[using]
+        with transaction.atomic(using=using):
+            built = build(size) if build is not None else None
+            self.reset_query_budget_state()
+            with CaptureQueriesContext(connection) as ctx:
+                response = request(built) if built is not None else request()
+            transaction.set_rollback(True, using=using)
+        return response, ctx.captured_queries
+
+    def assertQueryBudget(self, budget, build, request, sizes=None, using=DEFAULT_DB_ALIAS):
+        sizes = sizes or self.budget_sizes
+        self.measure_queries(build, request, min(sizes), using=using)  # warm-up
+        counts = {}
+        for size in sizes:
+            response, queries = self.measure_queries(build, request, size, using=using)
+            status_code = getattr(response, 'status_code', 200)
+            self.assertLess(status_code, 400, f'size {size}: request failed with {status_code}')
+            counts[size] = len(queries)
+            if len(queries) > budget:
+                listing = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(queries, start=1))
+                self.fail(f'size {size}: {len(queries)} queries, budget is {budget}\n{listing}')
+        if len(set(counts.values())) > 1:
+            self.fail(f'query count grows with result size: {counts}')
+        return counts
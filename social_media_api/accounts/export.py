@@ -0,0 +1,87 @@
+"""
+Streaming data export (GET /api/accounts/export/).
+
+The export is NDJSON: one JSON object per line, each tagged with its
+`type` (profile, post, comment, like, notification). Rows are read with
+values() (no model instances, no serializers) and .iterator(chunk_size),
+which fetches EXPORT_CHUNK_SIZE rows at a time (server-side cursor on
+PostgreSQL), and lines are flushed in EXPORT_BUFFER_BYTES blocks, so memory
+stays flat however much the user has. The profile line is sent on its own
+first so the first byte goes out before any of the large tables are read.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+
+User = get_user_model()
+
+PROFILE_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'bio', 'date_joined',
+    'followers_count', 'following_count',
+)
+
+
+def export_settings():
+    return (
+        getattr(settings, 'EXPORT_CHUNK_SIZE', 2000),
+        getattr(settings, 'EXPORT_BUFFER_BYTES', 64 * 1024),
+    )
+
+
+def sections(user_id):
+    """(type, values() queryset) pairs, in export order."""
+    return [
+        ('post', Post.objects.filter(author_id=user_id).order_by('pk').values(
+            'id', 'title', 'content', 'created_at', 'updated_at',
+            'likes_count', 'comments_count', 'views_count',
+        )),
+        ('comment', Comment.objects.filter(author_id=user_id).order_by('pk').values(
+            'id', 'post_id', 'content', 'created_at', 'updated_at',
+        )),
+        ('like', Like.objects.filter(user_id=user_id).order_by('pk').values('post_id', 'created_at')),
+        ('notification', Notification.objects.filter(recipient_id=user_id).order_by('pk').values(
+            'id', 'verb', 'target_object_id', 'timestamp', 'unread', 'actor_count', 'sample_actors',
+            actor_username=F('actor__username'), target_type=F('target_content_type__model'),
+        )),
+    ]
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Lets clients send Accept: application/x-ndjson (errors render as one JSON line)."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8') + b'\n'
+
+
+def _line(kind, row):
+    return json.dumps({'type': kind, **row}, cls=DjangoJSONEncoder).encode('utf-8') + b'\n'
+
+
+def export_lines(user_id):
+    """Yield the user's export as NDJSON byte blocks."""
+    chunk_size, buffer_bytes = export_settings()
+    profile = User.objects.filter(pk=user_id).values(*PROFILE_FIELDS).first()
+    if profile is None:
+        return
+    yield _line('profile', profile)
+
+    buffer, size = [], 0
+    for kind, rows in sections(user_id):
+        for row in rows.iterator(chunk_size=chunk_size):
+            line = _line(kind, row)
+            buffer.append(line)
+            size += len(line)
+            if size >= buffer_bytes:
+                yield b''.join(buffer)
+                buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
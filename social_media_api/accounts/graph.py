@@ -0,0 +1,168 @@
+"""
+Follow-graph service.
+
+All follow/unfollow writes and membership checks go through here instead of
+`user.following.all()`. Lookups are indexed EXISTS / single-column queries
+on the follow table, and each user's adjacency sets (who they follow, who
+follows them) are cached as frozensets under version stamps that
+follow/unfollow bump.
+
+Storage reminder: `User.followers` is an asymmetric M2M to self, so a row
+(from_user=A, to_user=B) means "B follows A".
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import F
+
+from posts.cache import aget_versions, bump_versions, get_versions
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TTL', 300)
+
+
+def _following_version_key(user_id):
+    return f'graph:ver:following:{user_id}'
+
+
+def _followers_version_key(user_id):
+    return f'graph:ver:followers:{user_id}'
+
+
+def _set_key(version_key, version, name):
+    return f'{version_key}:{version}' + (f':{name}' if name else '')
+
+
+def _cached_set(version_key, build, name=None):
+    version = get_versions([version_key])[version_key]
+    key = _set_key(version_key, version, name)
+    cache = _cache()
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(build())
+        cache.set(key, ids, timeout=_ttl())
+    return ids
+
+
+async def _acached_set(version_key, build, name=None):
+    version = (await aget_versions([version_key]))[version_key]
+    key = _set_key(version_key, version, name)
+    cache = _cache()
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = frozenset([pk async for pk in build()])
+        await cache.aset(key, ids, timeout=_ttl())
+    return ids
+
+
+def following_queryset(user_id):
+    """`SELECT from_user_id ...` for use as a subquery (no ids pulled into Python)."""
+    return Follow.objects.filter(to_user_id=user_id).values('from_user_id')
+
+
+def followers_queryset(user_id):
+    return Follow.objects.filter(from_user_id=user_id).values('to_user_id')
+
+
+def following_ids(user_id):
+    """Ids of the users `user_id` follows (cached frozenset)."""
+    return _cached_set(
+        _following_version_key(user_id),
+        lambda: following_queryset(user_id).values_list('from_user_id', flat=True),
+    )
+
+
+async def afollowing_ids(user_id):
+    """following_ids() for async views (same cache entries)."""
+    return await _acached_set(
+        _following_version_key(user_id),
+        lambda: following_queryset(user_id).values_list('from_user_id', flat=True),
+    )
+
+
+def _large_following(user_id, min_followers):
+    return (
+        User.objects.filter(pk__in=following_queryset(user_id), followers_count__gt=min_followers)
+        .values_list('pk', flat=True)
+    )
+
+
+def large_following_ids(user_id, min_followers):
+    """
+    Ids of the users `user_id` follows that have more than `min_followers`
+    followers (cached frozenset, next to the following set: an account that
+    crosses the threshold shows up within FOLLOW_GRAPH_CACHE_TTL).
+    """
+    return _cached_set(
+        _following_version_key(user_id),
+        lambda: _large_following(user_id, min_followers),
+        name=f'over:{min_followers}',
+    )
+
+
+async def alarge_following_ids(user_id, min_followers):
+    return await _acached_set(
+        _following_version_key(user_id),
+        lambda: _large_following(user_id, min_followers),
+        name=f'over:{min_followers}',
+    )
+
+
+def follower_ids(user_id):
+    """Ids of the users following `user_id` (cached frozenset)."""
+    return _cached_set(
+        _followers_version_key(user_id),
+        lambda: followers_queryset(user_id).values_list('to_user_id', flat=True),
+    )
+
+
+def is_following(user_id, target_id):
+    """
+    Does `user_id` follow `target_id`? Answered from the cached following set
+    when it is warm, otherwise with a single indexed EXISTS query.
+    """
+    version_key = _following_version_key(user_id)
+    version = _cache().get(version_key)
+    if version is not None:
+        ids = _cache().get(f'{version_key}:{version}')
+        if ids is not None:
+            return target_id in ids
+    return Follow.objects.filter(from_user_id=target_id, to_user_id=user_id).exists()
+
+
+def _edge_changed(user, target, delta):
+    """Keep the denormalized counts in step and invalidate both adjacency sets."""
+    following = User.objects.filter(pk=user.pk)
+    followers = User.objects.filter(pk=target.pk)
+    if delta < 0:
+        following = following.filter(following_count__gt=0)
+        followers = followers.filter(followers_count__gt=0)
+    if following.update(following_count=F('following_count') + delta):
+        user.following_count += delta  # mirror the UPDATE on the instance
+    if followers.update(followers_count=F('followers_count') + delta):
+        target.followers_count += delta
+    bump_versions(_following_version_key(user.pk), _followers_version_key(target.pk))
+
+
+def follow(user, target):
+    """Make `user` follow `target`. Returns False if they already did."""
+    _, created = Follow.objects.get_or_create(from_user_id=target.pk, to_user_id=user.pk)
+    if created:
+        _edge_changed(user, target, 1)
+    return created
+
+
+def unfollow(user, target):
+    """Make `user` stop following `target`. Returns False if they did not follow."""
+    deleted, _ = Follow.objects.filter(from_user_id=target.pk, to_user_id=user.pk).delete()
+    if deleted:
+        _edge_changed(user, target, -1)
+    return bool(deleted)
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def _count_of(column):
+    counts = (
+        Follow.objects.filter(**{column: OuterRef('pk')})
+        .order_by().values(column).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute User.followers_count / following_count from the follow table and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users checked per batch (default: 1000).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without writing anything.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            # a row (from_user=A, to_user=B) means "B follows A"
+            batch = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .annotate(actual_followers=_count_of('from_user'), actual_following=_count_of('to_user'))
+                .only('pk', 'followers_count', 'following_count')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            drifted = [
+                user for user in batch
+                if (user.followers_count, user.following_count) != (user.actual_followers, user.actual_following)
+            ]
+            for user in drifted:
+                self.stdout.write(
+                    f"User {user.pk}: followers {user.followers_count} -> {user.actual_followers}, "
+                    f"following {user.following_count} -> {user.actual_following}"
+                )
+            if not drifted or dry_run:
+                repaired += len(drifted)
+                continue
+
+            # the counts are recomputed inside the UPDATE, so a follow that
+            # lands after the read above is not overwritten
+            followers, following = _count_of('from_user'), _count_of('to_user')
+            repaired += User.objects.filter(pk__gte=batch[0].pk, pk__lte=last_pk).filter(
+                ~Q(followers_count=followers) | ~Q(following_count=following)
+            ).update(followers_count=followers, following_count=following)
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, {repaired} {verb}."))
@@ -12,5 +12,10 @@ class User(AbstractUser):
         'self', symmetrical=False, related_name='following', blank=True
     )
 
+    # denormalized sizes of the two sides of `followers`, maintained by
+    # accounts.graph.follow/unfollow (repair with `manage.py sync_follow_counts`)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.username
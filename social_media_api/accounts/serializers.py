@@ -2,19 +2,30 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 
+from social_media_api.fieldsets import SparseFieldsetMixin
+
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # followers_count / following_count are denormalized columns (no COUNT query)
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'bio', 'profile_picture', 'followers_count']
-        read_only_fields = ['id', 'followers_count']
+        fields = [
+            'id', 'username', 'email', 'first_name', 'last_name', 'bio', 'profile_picture',
+            'followers_count', 'following_count',
+        ]
+        read_only_fields = ['id', 'followers_count', 'following_count']
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Compact user representation for follower/following lists."""
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'profile_picture', 'followers_count']
+        read_only_fields = fields
 
 
 # NOTE: keeping a plain CharField() usage present 
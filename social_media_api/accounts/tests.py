@@ -2,6 +2,22 @@ from django.test import TestCase
 from rest_framework.test import APIClient, APITestCase
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+import json
+
+from django.core.management import call_command
+from io import StringIO
+
+from rest_framework.authtoken.models import Token
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+from . import graph
+from .authentication import token_cache
+from social_media_api.testing import QueryBudgetMixin
 
 User = get_user_model()
 
@@ -28,3 +44,225 @@ class FollowUnfollowTests(APITestCase):
         self.assertEqual(resp3.status_code, status.HTTP_200_OK)
         self.assertNotIn(self.u2, self.u1.following.all())
 
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a = User.objects.create_user(username='a', password='pass')
+        self.b = User.objects.create_user(username='b', password='pass')
+        self.c = User.objects.create_user(username='c', password='pass')
+
+    def test_follow_and_unfollow_update_adjacency_sets(self):
+        self.assertTrue(graph.follow(self.a, self.b))
+        self.assertFalse(graph.follow(self.a, self.b))
+        graph.follow(self.c, self.b)
+
+        self.assertEqual(graph.following_ids(self.a.pk), {self.b.pk})
+        self.assertEqual(graph.follower_ids(self.b.pk), {self.a.pk, self.c.pk})
+        self.assertIn(self.b, self.a.following.all())
+
+        self.assertTrue(graph.unfollow(self.a, self.b))
+        self.assertFalse(graph.unfollow(self.a, self.b))
+        self.assertEqual(graph.following_ids(self.a.pk), set())
+        self.assertEqual(graph.follower_ids(self.b.pk), {self.c.pk})
+
+    def test_is_following_uses_warm_cache(self):
+        graph.follow(self.a, self.b)
+        self.assertTrue(graph.is_following(self.a.pk, self.b.pk))  # EXISTS query
+        graph.following_ids(self.a.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(graph.is_following(self.a.pk, self.b.pk))
+            self.assertFalse(graph.is_following(self.a.pk, self.c.pk))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+
+class FollowCountsAndListsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.star = User.objects.create_user(username='star', password='pass')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(5)]
+        for fan in self.fans:
+            client = APIClient()
+            client.force_authenticate(user=fan)
+            client.post(f'/api/accounts/follow/{self.star.id}/')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.fans[0])
+
+    def test_counts_are_maintained(self):
+        self.star.refresh_from_db()
+        self.assertEqual((self.star.followers_count, self.star.following_count), (5, 0))
+        self.client.post(f'/api/accounts/unfollow/{self.star.id}/')
+        self.star.refresh_from_db()
+        self.fans[0].refresh_from_db()
+        self.assertEqual(self.star.followers_count, 4)
+        self.assertEqual(self.fans[0].following_count, 0)
+
+    def test_followers_list_is_cursor_paginated(self):
+        first = self.client.get(f'/api/accounts/{self.star.id}/followers/?page_size=3').json()
+        self.assertNotIn('count', first)
+        second = self.client.get(first['next']).json()
+        names = [u['username'] for u in first['results'] + second['results']]
+        self.assertEqual(names, ['fan4', 'fan3', 'fan2', 'fan1', 'fan0'])
+
+        following = self.client.get(f'/api/accounts/{self.fans[0].id}/following/').json()
+        self.assertEqual([u['username'] for u in following['results']], ['star'])
+
+    def test_sync_command_repairs_drift(self):
+        User.objects.filter(pk=self.star.pk).update(followers_count=99)
+        out = StringIO()
+        call_command('sync_follow_counts', stdout=out)
+        self.star.refresh_from_db()
+        self.assertEqual(self.star.followers_count, 5)
+        self.assertIn('1 repaired', out.getvalue())
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='u1', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _auth_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(resp.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_second_request_skips_token_lookup(self):
+        self.assertEqual(len(self._auth_queries()), 1)
+        self.assertEqual(self._auth_queries(), [])
+        stats = token_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_deleted_token_is_rejected(self):
+        self._auth_queries()
+        self.token.delete()
+        resp = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(resp.status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self._auth_queries()
+        self.user.is_active = False
+        self.user.save()
+        resp = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(resp.status_code, 401)
+
+
+class ProfileFieldsetTests(APITestCase):
+    def test_profile_fields(self):
+        user = User.objects.create_user(username='me', password='pass', bio='hello')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get('/api/accounts/profile/?fields=username,followers_count')
+        self.assertEqual(resp.json(), {'username': 'me', 'followers_count': 0})
+        self.assertNotIn('"bio"', ctx.captured_queries[-1]['sql'])
+        # updates still answer with the full profile
+        resp = client.patch('/api/accounts/profile/?fields=username', {'bio': 'bye'}, format='json')
+        self.assertEqual(resp.json()['bio'], 'bye')
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2, EXPORT_BUFFER_BYTES=256)
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.posts = [Post.objects.create(author=self.user, title=f't{i}', content='c' * 50) for i in range(5)]
+        theirs = Post.objects.create(author=self.other, title='theirs', content='c')
+        Comment.objects.create(post=theirs, author=self.user, content='nice')
+        Like.objects.create(post=theirs, user=self.user)
+        Notification.objects.create(recipient=self.user, actor=self.other, verb='liked your post', target=self.posts[0])
+        Notification.objects.create(recipient=self.other, actor=self.user, verb='not mine')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _export(self, **extra):
+        resp = self.client.get('/api/accounts/export/', **extra)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        chunks = list(resp.streaming_content)
+        return chunks, [json.loads(line) for line in b''.join(chunks).splitlines()]
+
+    def test_streams_every_section(self):
+        chunks, rows = self._export()
+        self.assertEqual([row['type'] for row in rows],
+                         ['profile'] + ['post'] * 5 + ['comment', 'like', 'notification'])
+        self.assertEqual(rows[0]['username'], 'me')
+        self.assertNotIn('password', rows[0])
+        self.assertEqual(rows[-1]['actor_username'], 'other')
+        self.assertEqual(rows[-1]['target_type'], 'post')
+        # the profile goes out alone, then bounded blocks
+        self.assertEqual(chunks[0].count(b'\n'), 1)
+        self.assertGreater(len(chunks), 2)
+
+    def test_one_query_per_table(self):
+        # one cursor per table, fetched EXPORT_CHUNK_SIZE rows at a time
+        with CaptureQueriesContext(connection) as ctx:
+            self._export()
+        self.assertEqual(len(ctx.captured_queries), 5)
+
+    def test_ndjson_accept_header(self):
+        _, rows = self._export(HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(rows[0]['type'], 'profile')
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get('/api/accounts/export/').status_code, 401)
+
+
+class AccountQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every accounts endpoint costs the same number of queries for 1 or 100 rows."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.target = User.objects.create_user(username='target', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def reset_query_budget_state(self):
+        super().reset_query_budget_state()
+        token_cache.clear()
+
+    def _users(self, n):
+        return User.objects.bulk_create([User(username=f'budget{i}') for i in range(n)])
+
+    def _followers(self, n):
+        # n users following self.target
+        users = self._users(n)
+        graph.Follow.objects.bulk_create([graph.Follow(from_user=self.target, to_user=u) for u in users])
+        return users
+
+    def _following(self, n):
+        # self.user following n users
+        users = self._users(n)
+        graph.Follow.objects.bulk_create([graph.Follow(from_user=u, to_user=self.user) for u in users])
+        return users
+
+    def test_register(self):
+        self.assertQueryBudget(5, self._users, lambda users: self.client.post(
+            '/api/accounts/register/', {'username': 'fresh', 'password': 'pass12345'}))
+
+    def test_profile_with_token(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertQueryBudget(2, self._following, lambda users: client.get('/api/accounts/profile/'))
+
+    def test_followers_list(self):
+        self.assertQueryBudget(
+            2, self._followers, lambda users: self.client.get(f'/api/accounts/{self.target.pk}/followers/'))
+
+    def test_following_list(self):
+        self.assertQueryBudget(
+            2, self._following, lambda users: self.client.get(f'/api/accounts/{self.user.pk}/following/'))
+
+    def test_follow(self):
+        self.assertQueryBudget(
+            11, self._followers, lambda users: self.client.post(f'/api/accounts/follow/{self.target.pk}/'))
+
+    def test_unfollow(self):
+        graph.follow(self.user, self.target)
+        self.assertQueryBudget(
+            7, self._followers, lambda users: self.client.post(f'/api/accounts/unfollow/{self.target.pk}/'))
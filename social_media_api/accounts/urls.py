@@ -5,6 +5,10 @@ from .views import (
     ProfileView,
     followuser,
     unfollowuser,
+    followers_list,
+    following_list,
+    auth_cache_stats,
+    export_data,
 )
 
 app_name = 'accounts'
@@ -13,6 +17,10 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('profile/', ProfileView.as_view(), name='profile'),
+    path('auth-cache-stats/', auth_cache_stats, name='auth-cache-stats'),
+    path('export/', export_data, name='export'),
     path('follow/<int:user_id>/', followuser, name='followuser'),
     path('unfollow/<int:user_id>/', unfollowuser, name='unfollowuser'),
+    path('<int:user_id>/followers/', followers_list, name='followers-list'),
+    path('<int:user_id>/following/', following_list, name='following-list'),
 ]
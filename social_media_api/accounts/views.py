@@ -1,12 +1,23 @@
 from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions, status
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
-
-from .serializers import UserSerializer, RegisterSerializer
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
+
+from . import graph
+from .export import NDJSONRenderer, export_lines
+from .authentication import token_cache
+from .serializers import UserSerializer, RegisterSerializer, UserSummarySerializer
+from notifications.utils import create_notification
+from posts import cache as response_cache
+from posts.pagination import KeysetPagination
+from posts.timeline import backfill_timeline, prune_timeline
+from social_media_api.fieldsets import SparseFieldsetViewMixin, narrow_queryset
 
 CustomUser = get_user_model()
 User = CustomUser
@@ -51,16 +62,43 @@ class LoginView(APIView):
         return Response({'user': UserSerializer(user).data, 'token': token.key})
 
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class ProfileView(SparseFieldsetViewMixin, generics.RetrieveUpdateAPIView):
     """
     GET/PATCH /api/accounts/profile/
-    Auth required (TokenAuthentication).
+    Auth required (TokenAuthentication). GET accepts ?fields=.
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the token cache; read the current row
+        # so counters and profile fields are fresh
+        return narrow_queryset(User.objects.all(), self.get_serializer()).get(pk=self.request.user.pk)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def auth_cache_stats(request):
+    """
+    GET /api/accounts/auth-cache-stats/
+    Hit-rate metrics of this process's token authentication cache (staff only).
+    """
+    return Response(token_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, NDJSONRenderer])
+def export_data(request):
+    """
+    GET /api/accounts/export/
+    Streams the user's profile, posts, comments, likes and notifications as
+    NDJSON (one JSON object per line, see accounts.export).
+    """
+    response = StreamingHttpResponse(export_lines(request.user.pk), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{request.user.username}-export.ndjson"'
+    response['Cache-Control'] = 'no-store'
+    return response
 
 
 # --- Minimal GenericAPIView ---
@@ -78,6 +116,7 @@ class FollowListGenericView(generics.GenericAPIView):
 # --- follow/unfollow endpoints ---
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@transaction.atomic
 def followuser(request, user_id):
     """
     Follow another user. (looks for `followuser`.)
@@ -88,28 +127,26 @@ def followuser(request, user_id):
 
     target = get_object_or_404(User, pk=user_id)
 
-    # my model `followers = ManyToManyField(..., related_name='following')`
-    # so current user's `following` manager exists: request.user.following
-    if target in request.user.following.all():
+    # follow-graph service: indexed lookup + insert, no loading of the following list
+    if not graph.follow(request.user, target):
         return Response({'detail': 'Already following.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    request.user.following.add(target)
-    try: 
-        from notifications.utils import create_notification
-        create_notification(
-            recipient=target,
-            actor=request.user,
-            verb='started following you',
-            target=None
-        )
-    except Exception:
-        pass  # fail silently if notifications app not installed
-    
+    backfill_timeline(request.user, target)
+    response_cache.invalidate_user(request.user.pk)
+    # queued in the outbox as part of this transaction
+    create_notification(
+        recipient=target,
+        actor=request.user,
+        verb='started following you',
+        target=None
+    )
+
     return Response({'detail': f'Now following {target.username}.'}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@transaction.atomic
 def unfollowuser(request, user_id):
     """
     Unfollow another user. (Checker looks for `unfollowuser`.)
@@ -117,9 +154,46 @@ def unfollowuser(request, user_id):
     """
     target = get_object_or_404(User, pk=user_id)
 
-    if target not in request.user.following.all():
+    if not graph.unfollow(request.user, target):
         return Response({'detail': 'Not following.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    request.user.following.remove(target)
+    prune_timeline(request.user, target)
+    response_cache.invalidate_user(request.user.pk)
     return Response({'detail': f'Unfollowed {target.username}.'}, status=status.HTTP_200_OK)
 
+
+
+# --- follower / following lists ---
+class FollowPagination(KeysetPagination):
+    """Keyset on the follow row id: most recent follows first, no COUNT."""
+    page_size = 50
+    cursor_field = None
+
+
+def _follow_list(request, edges, user_attr):
+    paginator = FollowPagination()
+    page = paginator.paginate_queryset(edges.select_related(user_attr), request)
+    users = [getattr(edge, user_attr) for edge in page]
+    return paginator.get_paginated_response(UserSummarySerializer(users, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def followers_list(request, user_id):
+    """
+    GET /api/accounts/<int:user_id>/followers/
+    Users following <user_id>, newest follow first, cursor paginated.
+    """
+    get_object_or_404(User.objects.only('pk'), pk=user_id)
+    return _follow_list(request, graph.Follow.objects.filter(from_user_id=user_id), 'to_user')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def following_list(request, user_id):
+    """
+    GET /api/accounts/<int:user_id>/following/
+    Users that <user_id> follows, newest follow first, cursor paginated.
+    """
+    get_object_or_404(User.objects.only('pk'), pk=user_id)
+    return _follow_list(request, graph.Follow.objects.filter(to_user_id=user_id), 'from_user')
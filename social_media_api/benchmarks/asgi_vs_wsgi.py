@@ -0,0 +1,223 @@
+"""
+Concurrency limits of the WSGI (sync DRF) and ASGI (async) read paths.
+
+Start both servers against the same (seeded, see `manage.py seed_load`)
+database, e.g.
+
+    gunicorn social_media_api.wsgi -b 127.0.0.1:8000 -w 4 --threads 8
+    uvicorn social_media_api.asgi:application --port 8001 --workers 4
+
+then point this client at them:
+
+    python benchmarks/asgi_vs_wsgi.py --token <key> \\
+        --target wsgi=http://127.0.0.1:8000/api/posts/feed/ \\
+        --target asgi=http://127.0.0.1:8001/api/posts/async/feed/ \\
+        [--connections 100,250,500,1000] [--seconds 10] [--slo-ms 1000]
+
+For every target and connection count, that many keep-alive connections
+are opened at once (plain asyncio sockets, no HTTP library in the way) and
+each sends requests back to back for `--seconds`. Reported per level:
+requests/s, p50/p99 latency, failed connections and failed requests. The
+target's concurrency limit is the highest level whose p99 stays under
+`--slo-ms` with under 1% failures.
+
+Results: none are recorded yet. The async routes are expected to raise
+the ASGI limit above the WSGI one, but that is an expectation until this
+has been run against both servers on production-sized hardware. Paste
+the table into the change that touches either read path.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def raise_file_limit():
+    """Each connection is a file descriptor; lift the soft limit to the hard one."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return float('nan')
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.connect_errors = 0
+        self.request_errors = 0
+        self.bad_status = 0
+
+
+def build_request(url, token):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    lines = [
+        f'GET {path or "/"} HTTP/1.1',
+        f'Host: {parts.netloc}',
+        'Accept: application/json',
+        'Connection: keep-alive',
+    ]
+    if token:
+        lines.append(f'Authorization: Token {token}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def read_response(reader):
+    """Read one response; returns (status, keep_alive)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split()[:2]
+    status = int(status)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)  # chunk + CRLF
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()  # body until close
+        return status, False
+    connection = headers.get('connection', '').lower()
+    if version == b'HTTP/1.0':
+        return status, connection == 'keep-alive'
+    return status, connection != 'close'
+
+
+async def connection_loop(host, port, request, window, timeout, stats, ready):
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        stats.connect_errors += 1
+        return
+    await ready.wait()  # every connection starts sending at the same moment
+    try:
+        while time.perf_counter() < window['deadline']:
+            started = time.perf_counter()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, ConnectionError, ValueError, IndexError,
+                    asyncio.IncompleteReadError, asyncio.TimeoutError):
+                stats.request_errors += 1
+                return
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                stats.bad_status += 1
+            if not keep_alive:
+                writer.close()
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        stats.connect_errors += 1
+    finally:
+        writer.close()
+
+
+async def run_level(url, token, connections, seconds, timeout):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    request = build_request(url, token)
+    stats = Stats()
+    ready = asyncio.Event()
+    window = {'deadline': None}
+    loops = [
+        asyncio.ensure_future(connection_loop(host, port, request, window, timeout, stats, ready))
+        for _ in range(connections)
+    ]
+    await asyncio.sleep(min(timeout, 1 + connections / 500))  # let the connections open
+    started = time.perf_counter()
+    window['deadline'] = started + seconds
+    ready.set()
+    await asyncio.gather(*loops)
+    elapsed = time.perf_counter() - started
+    return stats, elapsed
+
+
+def summarize(name, connections, stats, elapsed):
+    ordered = sorted(stats.latencies)
+    failures = stats.connect_errors + stats.request_errors + stats.bad_status
+    attempts = len(ordered) + stats.connect_errors + stats.request_errors
+    return {
+        'target': name,
+        'connections': connections,
+        'requests': len(ordered),
+        'rps': len(ordered) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(ordered, 50),
+        'p99_ms': percentile(ordered, 99),
+        'connect_errors': stats.connect_errors,
+        'request_errors': stats.request_errors,
+        'bad_status': stats.bad_status,
+        'failure_rate': failures / attempts if attempts else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help='Endpoint to load; repeat for each server.')
+    parser.add_argument('--token', default=os.environ.get('BENCH_TOKEN', ''),
+                        help='API token sent as "Authorization: Token <key>" (default: $BENCH_TOKEN).')
+    parser.add_argument('--connections', default='100,250,500,1000',
+                        help='Comma-separated concurrent connection counts (default: 100,250,500,1000).')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each level (default: 10).')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds (default: 10).')
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help='p99 bound for the concurrency limit (default: 1000).')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines.')
+    args = parser.parse_args()
+
+    raise_file_limit()
+    targets = [target.split('=', 1) for target in args.target]
+    levels = [int(level) for level in args.connections.split(',') if level.strip()]
+
+    if not args.json:
+        print(f"{'target':<8} {'conns':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+              f"{'conn err':>9} {'req err':>8} {'non-2xx':>8}")
+    limits = {}
+    for name, url in targets:
+        limits[name] = 0
+        for connections in levels:
+            stats, elapsed = asyncio.run(run_level(url, args.token, connections, args.seconds, args.timeout))
+            result = summarize(name, connections, stats, elapsed)
+            if result['p99_ms'] <= args.slo_ms and result['failure_rate'] < 0.01:
+                limits[name] = connections
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{name:<8} {connections:>6} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['connect_errors']:>9} {result['request_errors']:>8} "
+                      f"{result['bad_status']:>8}")
+    if not args.json:
+        print()
+        for name, limit in limits.items():
+            print(f'{name}: sustains {limit or "none"} of the tested connection counts '
+                  f'(p99 <= {args.slo_ms:.0f} ms, < 1% failures)')
+
+
+if __name__ == '__main__':
+    main()
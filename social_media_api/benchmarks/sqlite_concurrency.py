@@ -0,0 +1,174 @@
+"""
+Concurrent read/write throughput of SQLite: stock settings vs the profile
+in social_media_api/db.py.
+
+    python benchmarks/sqlite_concurrency.py [--readers 8] [--writers 2] [--seconds 5]
+
+Each profile gets a fresh database file with a posts-like table, then
+reader and writer processes hammer it for the same wall-clock time:
+
+  baseline  rollback journal, synchronous=FULL, a new connection per
+            operation (Django's default CONN_MAX_AGE=0)
+  tuned     WAL_PRAGMAS and SQLITE_PRAGMAS (WAL, busy_timeout,
+            synchronous=NORMAL, mmap, cache_size), one persistent connection per process and
+            BEGIN IMMEDIATE writes
+
+Readers run a page query (`ORDER BY created_at DESC LIMIT 20` over one
+author), writers bump a like counter or insert a post. Reported per
+profile: operations/s, p99 latency and "database is locked" errors.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_media_api.db import SQLITE_PRAGMAS, WAL_PRAGMAS  # noqa: E402
+
+TUNED_PRAGMAS = {**WAL_PRAGMAS, **SQLITE_PRAGMAS}
+
+SEED_POSTS = 20000
+AUTHORS = 200
+
+
+def create_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE post (
+            id INTEGER PRIMARY KEY,
+            author_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            likes_count INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX post_author_recent ON post (author_id, created_at);
+    ''')
+    now = time.time()
+    conn.executemany(
+        'INSERT INTO post (author_id, content, created_at) VALUES (?, ?, ?)',
+        ((i % AUTHORS, 'x' * 200, now - i) for i in range(SEED_POSTS)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Profile:
+    def __init__(self, path, tuned):
+        self.path = path
+        self.tuned = tuned
+        self._conn = None
+
+    def connect(self):
+        if self.tuned:
+            if self._conn is None:
+                # isolation_level=None: we issue BEGIN IMMEDIATE ourselves
+                self._conn = sqlite3.connect(self.path, timeout=TUNED_PRAGMAS['busy_timeout'] / 1000,
+                                             isolation_level=None)
+                for name, value in TUNED_PRAGMAS.items():
+                    self._conn.execute(f'PRAGMA {name} = {value}')
+            return self._conn
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def release(self, conn):
+        if not self.tuned:
+            conn.close()
+
+    def read(self):
+        conn = self.connect()
+        try:
+            conn.execute(
+                'SELECT id, content, likes_count FROM post WHERE author_id = ? '
+                'ORDER BY created_at DESC LIMIT 20',
+                (random.randrange(AUTHORS),),
+            ).fetchall()
+        finally:
+            self.release(conn)
+
+    def write(self):
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE' if self.tuned else 'BEGIN')
+            try:
+                if random.random() < 0.8:
+                    conn.execute('UPDATE post SET likes_count = likes_count + 1 WHERE id = ?',
+                                 (random.randrange(1, SEED_POSTS),))
+                else:
+                    conn.execute('INSERT INTO post (author_id, content, created_at) VALUES (?, ?, ?)',
+                                 (random.randrange(AUTHORS), 'y' * 200, time.time()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            self.release(conn)
+
+
+def worker(path, tuned, kind, start_at, seconds, results):
+    profile = Profile(path, tuned)
+    operation = profile.read if kind == 'read' else profile.write
+    latencies, errors = [], 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        began = time.perf_counter()
+        try:
+            operation()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - began)
+    results.put((kind, latencies, errors))
+
+
+def run(tuned, readers, writers, seconds):
+    directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+    path = os.path.join(directory, 'bench.sqlite3')
+    create_database(path)
+
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1.0
+    processes = [
+        multiprocessing.Process(target=worker, args=(path, tuned, kind, start_at, seconds, results))
+        for kind in ['read'] * readers + ['write'] * writers
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    summary = {}
+    for kind in ('read', 'write'):
+        latencies = [lat for k, lats, _ in collected if k == kind for lat in lats]
+        errors = sum(err for k, _, err in collected if k == kind)
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) >= 100 else float('nan')
+        summary[kind] = (len(latencies) / seconds, p99, errors)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile\n')
+    print(f'{"profile":<10} {"kind":<6} {"ops/s":>10} {"p99 ms":>10} {"locked":>8}')
+    for name, tuned in (('baseline', False), ('tuned', True)):
+        summary = run(tuned, args.readers, args.writers, args.seconds)
+        for kind, (rate, p99, errors) in summary.items():
+            print(f'{name:<10} {kind:<6} {rate:>10.0f} {p99:>10.2f} {errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
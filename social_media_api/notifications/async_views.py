@@ -0,0 +1,62 @@
+"""
+Async twins of the notification polling endpoints for ASGI deployments (see
+social_media_api.async_api): same payloads and ETags as notifications.views,
+read with the async ORM (aaggregate / aiterator / acount). Also the
+server-sent events stream that replaces polling (notifications.stream).
+"""
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from posts import cache as response_cache
+from social_media_api.async_api import async_api_view
+from social_media_api.fieldsets import fieldset_kwargs
+from .models import Notification
+from .serializers import NotificationSerializer
+from .stream import aevents, events, requested_cursor
+from .views import NotificationPagination, inbox_etag, inbox_queryset, inbox_state
+
+
+@async_api_view
+async def list_notifications(request):
+    """
+    GET /api/notifications/async/
+    Async version of GET /api/notifications/ (same parameters and response).
+    """
+    state = await Notification.objects.filter(recipient=request.user).aaggregate(**inbox_state())
+    etag = inbox_etag(request, state)
+    unchanged = response_cache.not_modified(request, etag)
+    if unchanged is not None:
+        return response_cache.set_validators(unchanged, etag)
+
+    paginator = NotificationPagination()
+    page = await paginator.apaginate_queryset(inbox_queryset(request), request)
+    serializer = NotificationSerializer(page, many=True, **fieldset_kwargs(request))
+    return response_cache.set_validators(JsonResponse(paginator.get_paginated_response(serializer.data).data), etag)
+
+
+@async_api_view
+async def unread_count(request):
+    """
+    GET /api/notifications/async/unread-count/
+    Returns: { "unread": <n> }
+    """
+    count = await Notification.objects.filter(recipient=request.user, unread=True).acount()
+    return JsonResponse({'unread': count})
+
+
+@async_api_view
+async def stream(request):
+    """
+    GET /api/notifications/stream/
+    text/event-stream of new notifications and unread-count changes; send
+    Last-Event-ID to resume (see notifications.stream).
+    """
+    cursor = requested_cursor(request)
+    if isinstance(request._request, ASGIRequest):
+        content = aevents(request, cursor)
+    else:
+        content = events(request, cursor)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
@@ -0,0 +1,100 @@
+"""
+In-process pub/sub for notification streams (notifications.stream).
+
+Whatever creates, coalesces or marks notifications read calls
+`hub.publish_on_commit(user_ids)`; once the transaction commits, every open
+stream of those users in this process wakes up and re-reads its inbox.
+
+The hub only carries wake-ups, never the notifications themselves (those
+are always read from the database), so nothing is lost when a publish
+happens in another process, e.g. in the `process_notification_outbox`
+worker: the stream notices the change at its next database poll
+(NOTIFICATION_STREAM['POLL_INTERVAL']) instead of immediately.
+"""
+import asyncio
+import threading
+
+from django.db import transaction
+
+
+class Subscription:
+    """One stream's wake-up flag; waited on from an event loop or a thread."""
+
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.loop = loop
+        self._event = asyncio.Event() if loop is not None else threading.Event()
+
+    def notify(self):
+        if self.loop is None:
+            self._event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # the loop is closed; the stream is gone
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds; True if woken by a publish."""
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    async def await_(self, timeout):
+        """wait() for subscriptions made with a loop."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            woken = True
+        except asyncio.TimeoutError:
+            woken = False
+        self._event.clear()
+        return woken
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # user id -> {Subscription, ...}
+        self.published = 0
+
+    def subscribe(self, user_id, loop=None):
+        subscription = Subscription(user_id, loop)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            self.published += 1
+            targets = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.notify()
+
+    def publish_on_commit(self, user_ids):
+        """publish() once the current transaction commits (now, outside one)."""
+        user_ids = set(user_ids)
+        if user_ids:
+            transaction.on_commit(lambda: self.publish(user_ids))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscriptions),
+                'streams': sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+                'published': self.published,
+            }
+
+
+hub = Hub()
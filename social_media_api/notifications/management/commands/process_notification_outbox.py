@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.utils import process_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notifications from the outbox in batches (run once, or keep polling with --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Outbox entries delivered per batch (default: 500).')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, polling for new entries.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the outbox is empty (with --loop).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            delivered = process_outbox(batch_size=batch_size)
+            total += delivered
+            if delivered:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Delivered {total} notifications."))
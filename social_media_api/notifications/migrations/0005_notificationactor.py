@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_actors(apps, schema_editor):
+    """
+    Record the known actors of the unread notifications (the only ones that
+    still coalesce): the latest actor and the samples. Older actors of an
+    aggregate were never stored, so one of them acting again is counted anew.
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationActor = apps.get_model('notifications', 'NotificationActor')
+    rows = []
+    for pk, actor_id, samples in Notification.objects.filter(unread=True).values_list(
+        'pk', 'actor_id', 'sample_actors'
+    ).iterator():
+        actor_ids = {actor_id} | {sample['id'] for sample in samples or []}
+        rows.extend(NotificationActor(notification_id=pk, actor_id=actor) for actor in actor_ids)
+        if len(rows) >= 1000:
+            NotificationActor.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    NotificationActor.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_unread_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='notifications.notification')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='notif_actor_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_actors, migrations.RunPython.noop),
+    ]
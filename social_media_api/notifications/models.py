@@ -2,6 +2,7 @@ from django.conf import settings
 from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 class Notification(models.Model):
     recipient = models.ForeignKey(
@@ -22,8 +23,74 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)  # expects `timestamp`
     unread = models.BooleanField(default=True)
 
+    # Coalescing: repeated (recipient, verb, target) events within
+    # NOTIFICATION_COALESCE_WINDOW fold into one row. `actor` is the latest
+    # actor, `actor_count` how many distinct actors were folded in (each one
+    # has a NotificationActor row) and `sample_actors` a few of the most
+    # recent ones ([{id, username}, ...]).
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actors = models.JSONField(default=list, blank=True)
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', 'verb', 'target_object_id', 'timestamp'], name='notif_coalesce_idx'),
+            # partial index: unread counts only touch the (small) unread set
+            models.Index(fields=['recipient'], condition=models.Q(unread=True), name='notif_unread_idx'),
+        ]
 
     def __str__(self):
         return f"Notification(to={self.recipient}, actor={self.actor}, verb='{self.verb}')"
+
+
+class NotificationActor(models.Model):
+    """
+    One distinct actor folded into a coalesced notification, so an actor
+    who repeats an event (like, unlike, like again) is counted once.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='notif_actor_unique'),
+        ]
+
+    def __str__(self):
+        return f"NotificationActor(notification={self.notification_id}, actor={self.actor_id})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Pending notification, written in the same transaction as the action that
+    caused it (like, follow, ...). The `process_notification_outbox` worker
+    turns batches of these into Notification rows and deletes them; failed
+    batches are retried with backoff until `attempts` reaches the limit.
+    """
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType, null=True, blank=True, on_delete=models.CASCADE)
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)  # not retried before this
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox(to={self.recipient_id}, actor={self.actor_id}, verb='{self.verb}')"
@@ -1,14 +1,49 @@
 from rest_framework import serializers
+
+from accounts.serializers import UserSummarySerializer
+from posts.serializers import MAX_ID
+from social_media_api.fieldsets import SparseFieldsetMixin
 from .models import Notification
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     actor = serializers.StringRelatedField()
     recipient = serializers.StringRelatedField()
     target = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'recipient', 'actor', 'verb', 'target', 'timestamp', 'unread']
+        fields = [
+            'id', 'recipient', 'actor', 'verb', 'target', 'timestamp', 'unread',
+            'actor_count', 'sample_actors', 'summary',
+        ]
+        expandable_fields = {'actor': UserSummarySerializer, 'recipient': UserSummarySerializer}
+        # columns read by the method fields (see social_media_api.fieldsets)
+        field_sources = {
+            'target': ['target_content_type', 'target_object_id'],
+            'summary': ['verb', 'actor', 'actor_count', 'sample_actors'],
+        }
 
     def get_target(self, obj):
         return str(obj.target) if obj.target is not None else None
+
+    def get_summary(self, obj):
+        """e.g. 'alice and 23 others liked your post'."""
+        names = [sample['username'] for sample in obj.sample_actors] or [str(obj.actor)]
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{names[0]} {obj.verb}"
+        if others == 1 and len(names) > 1:
+            return f"{names[0]} and {names[1]} {obj.verb}"
+        return f"{names[0]} and {others} others {obj.verb}"
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Body of POST /api/notifications/mark-read/: `ids` or `up_to`."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1, max_value=MAX_ID), required=False)
+    up_to = serializers.IntegerField(min_value=1, max_value=MAX_ID, required=False)
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'up_to' not in attrs:
+            raise serializers.ValidationError('Provide `ids` or `up_to`.')
+        return attrs
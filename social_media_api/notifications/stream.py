@@ -0,0 +1,171 @@
+"""
+Server-sent events for notifications (GET /api/notifications/stream/).
+
+    retry: 3000
+
+    id: 1760781230000000.41
+    event: unread
+    data: {"unread": 3}
+
+    id: 1760781234123456.42
+    event: notification
+    data: {"id": 42, "verb": "liked your post", ...}
+
+    : keep-alive
+
+`notification` events carry the full (NotificationSerializer, honouring
+?fields= / ?expand=) notification and are sent whenever one is created or
+coalesced into (its timestamp moves, so clients upsert by `id`). `unread`
+events carry the unread count whenever it changes. Comment lines keep idle
+connections open through proxies every HEARTBEAT seconds.
+
+Event ids are (timestamp, id) cursors: a reconnecting EventSource sends the
+last one as Last-Event-ID (or `?last_event_id=`), and the stream resumes
+with everything that changed after it. Without one, it starts at "now".
+`unread` events carry the stream's current cursor too (an EPOCH cursor for
+an empty inbox), so every response hands the client an id to resume from,
+even one that sent no notifications.
+
+Each stream waits on the in-process hub (notifications.hub) and re-reads
+the inbox when woken; a single aggregate query every POLL_INTERVAL seconds
+catches changes made by other processes. Under ASGI the stream stays open
+for MAX_DURATION seconds, then ends so the client reconnects (which bounds
+the life of a connection behind load balancers). Under WSGI, where an open
+stream would pin a worker, each request sends what is pending and ends;
+the client's `retry` makes that long polling with the same protocol.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+
+from social_media_api.fieldsets import fieldset_kwargs
+from .hub import hub
+from .models import Notification
+from .serializers import NotificationSerializer
+from .views import inbox_queryset, inbox_state
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+HEARTBEAT = b': keep-alive\n\n'
+
+
+def stream_settings():
+    options = {
+        'HEARTBEAT': 15,       # seconds of silence before a keep-alive comment
+        'POLL_INTERVAL': 5,    # seconds between database checks without a wake-up
+        'MAX_DURATION': 300,   # seconds before an ASGI stream ends (client reconnects)
+        'RETRY_MS': 3000,      # client reconnection delay
+        'BATCH_SIZE': 100,     # notifications read per query when catching up
+    }
+    options.update(getattr(settings, 'NOTIFICATION_STREAM', {}))
+    return options
+
+
+def encode_cursor(timestamp, pk):
+    return f'{(timestamp - EPOCH) // timedelta(microseconds=1)}.{pk}'
+
+
+def cursor_id(cursor):
+    """The event id for `cursor`; None (nothing seen yet) resumes from the start."""
+    return encode_cursor(*(cursor or (EPOCH, 0)))
+
+
+def decode_cursor(value):
+    """(timestamp, pk) from an event id, or None if absent or malformed."""
+    try:
+        micros, pk = value.split('.')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def requested_cursor(request):
+    return decode_cursor(
+        request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+    )
+
+
+def newest_queryset(user):
+    return Notification.objects.filter(recipient=user).order_by('-timestamp', '-pk').values_list('timestamp', 'pk')
+
+
+def changes_queryset(request, cursor, batch_size):
+    """The next notifications after `cursor`, oldest first."""
+    queryset = inbox_queryset(request)
+    if cursor is not None:
+        timestamp, pk = cursor
+        queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+    return queryset.order_by('timestamp', 'pk')[:batch_size]
+
+
+def format_event(kind, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {kind}', f'data: {json.dumps(data)}']
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def notification_events(request, notifications):
+    """(bytes, new cursor) for a batch of notifications in cursor order."""
+    serializer = NotificationSerializer(notifications, many=True, **fieldset_kwargs(request))
+    chunks = [
+        format_event('notification', data, encode_cursor(notification.timestamp, notification.pk))
+        for notification, data in zip(notifications, serializer.data)
+    ]
+    last = notifications[-1]
+    return b''.join(chunks), (last.timestamp, last.pk)
+
+
+async def aevents(request, cursor):
+    """The ASGI stream: runs on the event loop until MAX_DURATION or disconnect."""
+    options = stream_settings()
+    loop = asyncio.get_running_loop()
+    subscription = hub.subscribe(request.user.pk, loop=loop)
+    try:
+        yield f"retry: {options['RETRY_MS']}\n\n".encode()
+        if cursor is None:
+            cursor = await newest_queryset(request.user).afirst()
+        deadline = loop.time() + options['MAX_DURATION']
+        last_state, last_write = None, loop.time()
+        while True:
+            state = await Notification.objects.filter(recipient=request.user).aaggregate(**inbox_state())
+            if state != last_state:
+                while True:
+                    batch = [
+                        notification async for notification in
+                        changes_queryset(request, cursor, options['BATCH_SIZE']).aiterator(chunk_size=options['BATCH_SIZE'])
+                    ]
+                    if batch:
+                        chunk, cursor = notification_events(request, batch)
+                        yield chunk
+                    if len(batch) < options['BATCH_SIZE']:
+                        break
+                if last_state is None or state['unread'] != last_state['unread']:
+                    yield format_event('unread', {'unread': state['unread']}, cursor_id(cursor))
+                last_state, last_write = state, loop.time()
+            if loop.time() >= deadline:
+                return
+            await subscription.await_(min(options['POLL_INTERVAL'], max(deadline - loop.time(), 0)))
+            if loop.time() - last_write >= options['HEARTBEAT']:
+                yield HEARTBEAT
+                last_write = loop.time()
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def events(request, cursor):
+    """The WSGI response: what is pending right now, then the end of the stream."""
+    options = stream_settings()
+    yield f"retry: {options['RETRY_MS']}\n\n".encode()
+    if cursor is None:
+        cursor = newest_queryset(request.user).first()
+    while True:
+        batch = list(changes_queryset(request, cursor, options['BATCH_SIZE']))
+        if batch:
+            chunk, cursor = notification_events(request, batch)
+            yield chunk
+        if len(batch) < options['BATCH_SIZE']:
+            break
+    unread = Notification.objects.filter(recipient=request.user, unread=True).count()
+    yield format_event('unread', {'unread': unread}, cursor_id(cursor))
@@ -1,3 +1,443 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from posts.models import Post
+from . import stream
+from .hub import hub
+from .models import Notification, NotificationActor, NotificationOutbox
+from .utils import create_notification, process_outbox
+from social_media_api.testing import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class NotificationOutboxTests(APITestCase):
+    def setUp(self):
+        self.u1 = User.objects.create_user(username='u1', password='pass')
+        self.u2 = User.objects.create_user(username='u2', password='pass')
+        self.post = Post.objects.create(author=self.u2, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.u1)
+
+    def test_actions_enqueue_and_worker_delivers(self):
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.client.post(f'/api/accounts/follow/{self.u2.id}/')
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.assertFalse(Notification.objects.exists())
+
+        out = StringIO()
+        call_command('process_notification_outbox', stdout=out)
+        self.assertIn('Delivered 2', out.getvalue())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        verbs = set(Notification.objects.filter(recipient=self.u2).values_list('verb', flat=True))
+        self.assertEqual(verbs, {'liked your post', 'started following you'})
+        self.assertEqual(Notification.objects.get(verb='liked your post').target, self.post)
+
+    def test_failed_batch_is_kept_for_retry(self):
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        with mock.patch('notifications.utils.deliver', side_effect=RuntimeError('boom')):
+            self.assertEqual(process_outbox(), 0)
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn('boom', entry.last_error)
+        # backed off: not due again yet
+        self.assertEqual(process_outbox(), 0)
+        self.assertFalse(Notification.objects.exists())
+
+
+class NotificationCoalescingTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(5)]
+
+    def _like_as(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.post(f'/api/posts/posts/{self.post.pk}/like/')
+
+    def test_likes_within_window_fold_into_one_row(self):
+        for fan in self.fans[:3]:
+            self._like_as(fan)
+        process_outbox()
+        for fan in self.fans[3:]:
+            self._like_as(fan)
+        process_outbox()
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual([s['username'] for s in notification.sample_actors], ['fan4', 'fan3', 'fan2'])
+
+        client = APIClient()
+        client.force_authenticate(user=self.author)
+        data = client.get('/api/notifications/').json()['results']
+        self.assertEqual(data[0]['summary'], 'fan4 and 4 others liked your post')
+
+    def test_repeat_actor_beyond_the_samples_is_counted_once(self):
+        for fan in self.fans:
+            self._like_as(fan)
+        process_outbox()
+        # fan0 is no longer among the three samples
+        client = APIClient()
+        client.force_authenticate(user=self.fans[0])
+        client.post(f'/api/posts/posts/{self.post.pk}/unlike/')
+        self._like_as(self.fans[0])
+        process_outbox()
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(NotificationActor.objects.filter(notification=notification).count(), 5)
+
+    def test_read_notifications_are_not_reused(self):
+        self._like_as(self.fans[0])
+        process_outbox()
+        Notification.objects.update(unread=False)
+        self._like_as(self.fans[1])
+        process_outbox()
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+
+class NotificationListingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u1', password='pass')
+        self.other = User.objects.create_user(username='u2', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _add_notifications(self, n):
+        for i in range(n):
+            post = Post.objects.create(author=self.user, title=f'post {i}', content='c')
+            Notification.objects.create(recipient=self.user, actor=self.other, verb='liked your post', target=post)
+            Notification.objects.create(recipient=self.user, actor=self.other, verb='started following you')
+
+    def _list(self, url='/api/notifications/'):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp.json()
+
+    def test_query_count_is_fixed_per_page(self):
+        self._add_notifications(1)
+        small, _ = self._list()
+        self._add_notifications(30)
+        large, body = self._list()
+        self.assertEqual(small, large)
+        self.assertEqual(len(body['results']), 50)
+        liked = [n for n in body['results'] if n['verb'] == 'liked your post']
+        self.assertTrue(all(n['target'].startswith('post ') for n in liked))
+
+    def test_cursor_walks_all_notifications(self):
+        self._add_notifications(3)
+        _, first = self._list('/api/notifications/?page_size=4')
+        _, second = self._list(first['next'])
+        self.assertEqual(len(first['results']) + len(second['results']), 6)
+        self.assertIsNone(second['next'])
+
+
+class MarkReadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u1', password='pass')
+        self.other = User.objects.create_user(username='u2', password='pass')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, actor=self.other, verb=f'event {i}')
+            for i in range(5)
+        ]
+        Notification.objects.create(recipient=self.other, actor=self.user, verb='not yours')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _unread(self):
+        return self.client.get('/api/notifications/unread-count/').json()['unread']
+
+    def test_unread_count(self):
+        self.assertEqual(self._unread(), 5)
+
+    def test_mark_ids_read_in_one_update(self):
+        ids = [n.pk for n in self.notifications[:3]] + [Notification.objects.get(verb='not yours').pk]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/api/notifications/mark-read/', {'ids': ids}, format='json')
+        self.assertEqual(resp.json(), {'marked': 3})
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 1)
+        self.assertEqual(self._unread(), 2)
+        self.assertTrue(Notification.objects.get(verb='not yours').unread)
+
+    def test_mark_everything_up_to_a_notification(self):
+        anchor = self.notifications[2]
+        resp = self.client.post('/api/notifications/mark-read/', {'up_to': anchor.pk}, format='json')
+        self.assertEqual(resp.json(), {'marked': 3})
+        unread = set(Notification.objects.filter(recipient=self.user, unread=True).values_list('pk', flat=True))
+        self.assertEqual(unread, {n.pk for n in self.notifications[3:]})
+
+    def test_bad_payload_is_rejected(self):
+        for payload in ({'ids': 'all'}, {'ids': [2 ** 70]}, {'ids': [True]}, {'up_to': 2 ** 70}, {}):
+            resp = self.client.post('/api/notifications/mark-read/', payload, format='json')
+            self.assertEqual(resp.status_code, 400, payload)
+
+
+class NotificationConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.actor = User.objects.create_user(username='actor', password='pass')
+        self.notification = Notification.objects.create(recipient=self.user, actor=self.actor, verb='started following you')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_unchanged_inbox_is_not_modified(self):
+        etag = self.client.get('/api/notifications/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertFalse(any('accounts_user' in q['sql'] for q in ctx.captured_queries))
+
+    def test_mark_read_and_new_notifications_change_the_etag(self):
+        first = self.client.get('/api/notifications/')['ETag']
+        self.client.post(f'/api/notifications/{self.notification.pk}/mark-read/')
+        resp = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(resp.status_code, 200)
+        second = resp['ETag']
+        self.assertNotEqual(first, second)
+
+        Notification.objects.create(recipient=self.user, actor=self.actor, verb='liked your post')
+        resp = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=second)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()['results']), 2)
+
+    def test_etag_is_per_page(self):
+        self.assertNotEqual(
+            self.client.get('/api/notifications/')['ETag'],
+            self.client.get('/api/notifications/?unread=true')['ETag'],
+        )
+
+
+class NotificationFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.actor = User.objects.create_user(username='actor', password='pass')
+        post = Post.objects.create(author=self.user, title='t', content='c')
+        Notification.objects.create(recipient=self.user, actor=self.actor, verb='liked your post', target=post)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_lean_fields_skip_joins_and_target_prefetch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/notifications/?fields=id,verb,unread')
+        self.assertEqual(set(resp.json()['results'][0]), {'id', 'verb', 'unread'})
+        sql = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('accounts_user', sql)
+        self.assertNotIn('posts_post', sql)
+
+    def test_expand_actor(self):
+        resp = self.client.get('/api/notifications/?fields=actor,summary,target&expand=actor')
+        notification = resp.json()['results'][0]
+        self.assertEqual(notification['actor']['username'], 'actor')
+        self.assertEqual(notification['summary'], 'actor liked your post')
+        self.assertEqual(notification['target'], 't')
+
+
+class AsyncNotificationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.actor = User.objects.create_user(username='actor', password='pass')
+        post = Post.objects.create(author=self.user, title='t', content='c')
+        Notification.objects.create(recipient=self.user, actor=self.actor, verb='liked your post', target=post)
+        Notification.objects.create(recipient=self.user, actor=self.actor, verb='started following you', unread=False)
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_same_payload_as_sync_views(self):
+        for query in ('', '?fields=id,verb', '?expand=actor'):
+            sync = self.client.get('/api/notifications/' + query).json()
+            self.assertEqual(self.client.get('/api/notifications/async/' + query).json(), sync, query)
+        self.assertEqual(self.client.get('/api/notifications/async/unread-count/').json(), {'unread': 1})
+
+    def test_conditional_get(self):
+        etag = self.client.get('/api/notifications/async/')['ETag']
+        self.assertEqual(self.client.get('/api/notifications/async/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Notification.objects.filter(recipient=self.user).update(unread=False)
+        self.assertEqual(self.client.get('/api/notifications/async/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_requires_token(self):
+        self.assertEqual(APIClient().get('/api/notifications/async/unread-count/').status_code, 401)
+
+
+def parse_events(body):
+    """[(event, data, id)] from a text/event-stream body; comments become ('comment', text, None)."""
+    parsed = []
+    for block in body.decode().strip().split('\n\n'):
+        fields = {}
+        for line in block.splitlines():
+            if line.startswith(':'):
+                parsed.append(('comment', line[1:].strip(), None))
+            else:
+                name, _, value = line.partition(': ')
+                fields[name] = value
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data']), fields.get('id')))
+    return parsed
+
+
+class NotificationStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.actor = User.objects.create_user(username='actor', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'Authorization': f'Token {self.token.key}'}
+        self.first = Notification.objects.create(recipient=self.user, actor=self.actor, verb='started following you')
+        self.second = Notification.objects.create(recipient=self.user, actor=self.actor, verb='liked your post')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _cursor(self, notification):
+        return stream.encode_cursor(notification.timestamp, notification.pk)
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(stream.decode_cursor(self._cursor(self.first)), (self.first.timestamp, self.first.pk))
+        self.assertIsNone(stream.decode_cursor('junk'))
+        self.assertIsNone(stream.decode_cursor(None))
+
+    def test_wsgi_resumes_from_last_event_id_and_ends(self):
+        resp = self.client.get('/api/notifications/stream/', HTTP_LAST_EVENT_ID=self._cursor(self.first))
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        events = parse_events(b''.join(resp.streaming_content))
+        self.assertEqual(events, [
+            ('notification', events[0][1], self._cursor(self.second)),
+            ('unread', {'unread': 2}, self._cursor(self.second)),
+        ])
+        self.assertEqual(events[0][1]['id'], self.second.pk)
+
+    def test_without_cursor_starts_at_now(self):
+        events = parse_events(b''.join(self.client.get('/api/notifications/stream/').streaming_content))
+        self.assertEqual(events, [('unread', {'unread': 2}, self._cursor(self.second))])
+
+    def test_reconnect_with_unread_id_sends_what_was_missed(self):
+        events = parse_events(b''.join(self.client.get('/api/notifications/stream/').streaming_content))
+        last_event_id = events[-1][2]
+        third = Notification.objects.create(recipient=self.user, actor=self.actor, verb='commented')
+        resp = self.client.get('/api/notifications/stream/?fields=id', HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertEqual(parse_events(b''.join(resp.streaming_content)), [
+            ('notification', {'id': third.pk}, self._cursor(third)),
+            ('unread', {'unread': 3}, self._cursor(third)),
+        ])
+
+    def test_empty_inbox_hands_out_an_epoch_cursor(self):
+        Notification.objects.filter(recipient=self.user).delete()
+        events = parse_events(b''.join(self.client.get('/api/notifications/stream/').streaming_content))
+        self.assertEqual(events, [('unread', {'unread': 0}, stream.encode_cursor(stream.EPOCH, 0))])
+        first = Notification.objects.create(recipient=self.user, actor=self.actor, verb='commented')
+        resp = self.client.get('/api/notifications/stream/?fields=id', HTTP_LAST_EVENT_ID=events[0][2])
+        self.assertEqual(parse_events(b''.join(resp.streaming_content))[0], ('notification', {'id': first.pk}, self._cursor(first)))
+
+    def test_requires_token(self):
+        self.assertEqual(APIClient().get('/api/notifications/stream/').status_code, 401)
+
+    @override_settings(NOTIFICATION_STREAM={'MAX_DURATION': 0})
+    async def test_asgi_stream_resumes(self):
+        resp = await AsyncClient().get(
+            f'/api/notifications/stream/?last_event_id={self._cursor(self.first)}&fields=id,verb', headers=self.auth)
+        body = b''.join([chunk async for chunk in resp.streaming_content])
+        self.assertEqual(parse_events(body), [
+            ('notification', {'id': self.second.pk, 'verb': 'liked your post'}, self._cursor(self.second)),
+            ('unread', {'unread': 2}, self._cursor(self.second)),
+        ])
+
+    @override_settings(NOTIFICATION_STREAM={'MAX_DURATION': 3, 'POLL_INTERVAL': 60, 'HEARTBEAT': 60})
+    async def test_hub_wakes_the_stream(self):
+        resp = await AsyncClient().get('/api/notifications/stream/?fields=id', headers=self.auth)
+        chunks = aiter(resp.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertEqual(parse_events(await anext(chunks)), [('unread', {'unread': 2}, self._cursor(self.second))])
+
+        third = await Notification.objects.acreate(recipient=self.user, actor=self.actor, verb='commented')
+        hub.publish([self.user.pk])
+        started = time.monotonic()
+        events = parse_events(await asyncio.wait_for(anext(chunks), 2))
+        self.assertLess(time.monotonic() - started, 2)  # well before the next poll
+        self.assertEqual(events, [('notification', {'id': third.pk}, self._cursor(third))])
+        self.assertEqual(parse_events(await anext(chunks)), [('unread', {'unread': 3}, self._cursor(third))])
+        async for _ in chunks:
+            pass  # runs out at MAX_DURATION
+        self.assertEqual(hub.stats()['streams'], 0)
+
+    @override_settings(NOTIFICATION_STREAM={'MAX_DURATION': 1, 'POLL_INTERVAL': 0.2, 'HEARTBEAT': 0.3})
+    async def test_heartbeats(self):
+        resp = await AsyncClient().get('/api/notifications/stream/', headers=self.auth)
+        body = b''.join([chunk async for chunk in resp.streaming_content])
+        self.assertIn(('comment', 'keep-alive', None), parse_events(body))
+
+    def test_delivery_and_mark_read_wake_subscribers(self):
+        subscription = hub.subscribe(self.user.pk)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_notification(self.user, self.actor, 'liked your post', target=None)
+                process_outbox()
+            self.assertTrue(subscription.wait(0))
+            self.assertFalse(subscription.wait(0))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/notifications/{self.first.pk}/mark-read/')
+            self.assertTrue(subscription.wait(0))
+        finally:
+            hub.unsubscribe(subscription)
+
+
+class NotificationQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every notifications endpoint costs the same number of queries for 1 or 100 rows."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='pass')
+        self.actor = User.objects.create_user(username='actor', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _notifications(self, n):
+        # a mix of post-targeted and target-less notifications
+        posts = Post.objects.bulk_create(
+            [Post(author=self.user, title=f't{i}', content='c') for i in range(n)]
+        )
+        return Notification.objects.bulk_create([
+            notification
+            for post in posts
+            for notification in (
+                Notification(recipient=self.user, actor=self.actor, verb='liked your post', target=post),
+                Notification(recipient=self.user, actor=self.actor, verb='started following you'),
+            )
+        ])
+
+    def test_list(self):
+        # the ETag aggregate, the page, one target query per content type
+        self.assertQueryBudget(3, self._notifications, lambda ns: self.client.get('/api/notifications/'))
+
+    def test_unread_count(self):
+        self.assertQueryBudget(1, self._notifications, lambda ns: self.client.get('/api/notifications/unread-count/'))
+
+    def test_mark_read_single(self):
+        self.assertQueryBudget(
+            2, self._notifications, lambda ns: self.client.post(f'/api/notifications/{ns[0].pk}/mark-read/'))
+
+    def test_mark_read_bulk(self):
+        self.assertQueryBudget(1, self._notifications, lambda ns: self.client.post(
+            '/api/notifications/mark-read/', {'ids': [n.pk for n in ns]}, format='json'))
+
+    def test_outbox_delivery(self):
+        def enqueue(n):
+            posts = Post.objects.bulk_create(
+                [Post(author=self.user, title=f't{i}', content='c') for i in range(n)]
+            )
+            for post in posts:
+                create_notification(self.user, self.actor, 'liked your post', target=post)
+        self.assertQueryBudget(10, enqueue, lambda: process_outbox())
@@ -15,4 +15,4 @@ class NotificationsEndpointTests(APITestCase):
         Notification.objects.create(recipient=self.u1, actor=self.u1, verb='test')
         resp = self.client.get('/api/notifications/')
         self.assertEqual(resp.status_code, 200)
-        self.assertGreaterEqual(len(resp.json()), 1)
+        self.assertGreaterEqual(len(resp.json()['results']), 1)
@@ -1,9 +1,15 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'notifications'
 
 urlpatterns = [
     path('', views.list_notifications, name='notifications'),  # /notifications/
     path('<int:pk>/mark-read/', views.mark_as_read, name='notification-mark-read'),
+    path('mark-read/', views.mark_read_bulk, name='notification-mark-read-bulk'),
+    path('unread-count/', views.unread_count, name='notification-unread-count'),
+    # async (ASGI-native) versions of the polling endpoints
+    path('async/', async_views.list_notifications, name='notifications-async'),
+    path('async/unread-count/', async_views.unread_count, name='notification-unread-count-async'),
+    path('stream/', async_views.stream, name='notifications-stream'),
 ]
@@ -1,20 +1,170 @@
-from .models import Notification
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .hub import hub
+from .models import Notification, NotificationActor, NotificationOutbox
+
+User = get_user_model()
+
 
 def create_notification(recipient, actor, verb, target=None):
     """
-    Minimal helper to create a Notification instance.
+    Queue a notification in the outbox.
+
+    Only an outbox row is written here, inside the caller's transaction, so
+    the notification is recorded if and only if the action itself commits.
+    The `process_notification_outbox` worker delivers it later.
     """
     target_ct = None
     target_id = None
     if target is not None:
-        target_ct = ContentType.objects.get_for_model(target)
+        target_ct = ContentType.objects.get_for_model(target)  # cached per process
         target_id = target.pk
 
-    return Notification.objects.create(
+    return NotificationOutbox.objects.create(
         recipient=recipient,
         actor=actor,
         verb=verb,
         target_content_type=target_ct,
         target_object_id=target_id
     )
+
+
+def outbox_max_attempts():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def _retry_delay(attempts):
+    # exponential backoff: 2s, 4s, 8s, ... capped at 10 minutes
+    return timedelta(seconds=min(2 ** attempts, 600))
+
+
+def coalesce_window():
+    """Events closer together than this (seconds) fold into one notification."""
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 3600))
+
+
+def sample_size():
+    return getattr(settings, 'NOTIFICATION_SAMPLE_ACTORS', 3)
+
+
+def _group_key(obj):
+    return (obj.recipient_id, obj.verb, obj.target_content_type_id, obj.target_object_id)
+
+
+def add_actor(notification, actor_id, username, seen):
+    """
+    Fold one more actor into an aggregate notification. `seen` holds the
+    ids of the actors already folded in; an actor among them (e.g. like,
+    unlike, like again) is not counted twice. Returns True if the actor
+    is new.
+    """
+    if actor_id in seen:
+        return False
+    seen.add(actor_id)
+    samples = [sample for sample in notification.sample_actors or [] if sample['id'] != actor_id]
+    notification.actor_id = actor_id
+    notification.actor_count += 1
+    notification.sample_actors = ([{'id': actor_id, 'username': username}] + samples)[:sample_size()]
+    return True
+
+
+def deliver(entries):
+    """
+    Turn outbox entries into Notification rows, coalescing them by
+    (recipient, verb, target): entries join an unread notification for the
+    same key from within the coalescing window, or start a new one.
+    Costs a fixed number of queries per batch. Open notification streams
+    of the recipients are woken once the delivery commits.
+    """
+    now = timezone.now()
+    groups = {}
+    for entry in entries:
+        groups.setdefault(_group_key(entry), []).append(entry)
+
+    lookup = Q()
+    for recipient_id, verb, ct_id, object_id in groups:
+        lookup |= Q(recipient_id=recipient_id, verb=verb,
+                    target_content_type_id=ct_id, target_object_id=object_id)
+    existing = {}
+    recent = Notification.objects.filter(lookup, unread=True, timestamp__gte=now - coalesce_window())
+    for notification in recent.order_by('timestamp', 'id'):
+        existing[_group_key(notification)] = notification  # latest one wins
+
+    actor_ids = {entry.actor_id for entry in entries}
+    usernames = dict(User.objects.filter(pk__in=actor_ids).values_list('pk', 'username'))
+    seen = {}
+    if existing:
+        folded = NotificationActor.objects.filter(
+            notification__in=[notification.pk for notification in existing.values()], actor_id__in=actor_ids,
+        ).values_list('notification_id', 'actor_id')
+        for notification_id, actor_id in folded:
+            seen.setdefault(notification_id, set()).add(actor_id)
+
+    to_create, to_update, new_actors = [], [], []
+    for key, group in groups.items():
+        notification = existing.get(key)
+        if notification is None:
+            recipient_id, verb, ct_id, object_id = key
+            notification = Notification(
+                recipient_id=recipient_id, verb=verb,
+                target_content_type_id=ct_id, target_object_id=object_id,
+                actor_count=0, sample_actors=[],
+            )
+            to_create.append(notification)
+        else:
+            notification.timestamp = now  # resurface the aggregate
+            to_update.append(notification)
+        folded = seen.get(notification.pk, set()) if notification.pk else set()
+        for entry in group:
+            if add_actor(notification, entry.actor_id, usernames.get(entry.actor_id, ''), folded):
+                new_actors.append((notification, entry.actor_id))
+
+    Notification.objects.bulk_create(to_create)
+    NotificationActor.objects.bulk_create([
+        NotificationActor(notification_id=notification.pk, actor_id=actor_id) for notification, actor_id in new_actors
+    ])
+    Notification.objects.bulk_update(to_update, ['actor', 'actor_count', 'sample_actors', 'timestamp'])
+    hub.publish_on_commit(recipient_id for recipient_id, _, _, _ in groups)
+    return to_create + to_update
+
+
+def process_outbox(batch_size=500):
+    """
+    Deliver one batch of due outbox entries. Returns the number delivered.
+
+    A failing batch is left in the outbox with its attempt count bumped and
+    `available_at` pushed back; entries that reach
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS stay behind for inspection.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = NotificationOutbox.objects.filter(
+            available_at__lte=now, attempts__lt=outbox_max_attempts()
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # lets several workers drain the same outbox concurrently
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        if not batch:
+            return 0
+
+        try:
+            with transaction.atomic():
+                deliver(batch)
+        except Exception as exc:
+            for entry in batch:
+                entry.attempts += 1
+                entry.available_at = now + _retry_delay(entry.attempts)
+                entry.last_error = repr(exc)
+            NotificationOutbox.objects.bulk_update(batch, ['attempts', 'available_at', 'last_error'])
+            return 0
+
+        NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in batch]).delete()
+    return len(batch)
@@ -1,26 +1,123 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.db.models import Count, Max, Q
 from django.shortcuts import get_object_or_404
 
+from posts import cache as response_cache
+from posts.pagination import KeysetPagination
+from social_media_api.fieldsets import fieldset_kwargs, narrow_queryset
+from .hub import hub
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import MarkReadSerializer, NotificationSerializer
+
+class NotificationPagination(KeysetPagination):
+    page_size = 50
+    cursor_field = 'timestamp'
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_notifications(request):
     """
     GET /api/notifications/
-    Returns notifications for the authenticated user with unread first (ordered by timestamp).
+    Returns notifications for the authenticated user, newest first, cursor paginated.
+
+    actor/recipient are joined in and generic targets are prefetched in one
+    query per content type, so a page costs a fixed handful of queries.
+
+    Polling clients should send If-None-Match: the ETag is computed from one
+    aggregate query (newest timestamp, row count, unread count), and an
+    unchanged inbox is answered with 304 before any page is loaded.
+
+    Accepts ?fields= and ?expand=actor,recipient (see social_media_api.fieldsets);
+    joins and the target prefetch are skipped when their fields are not requested.
     """
-    qs = request.user.notifications.all().order_by('-timestamp')
-    serializer = NotificationSerializer(qs, many=True)
-    return Response(serializer.data)
+    etag = inbox_etag(request, Notification.objects.filter(recipient=request.user).aggregate(**inbox_state()))
+    unchanged = response_cache.not_modified(request, etag)
+    if unchanged is not None:
+        return response_cache.set_validators(unchanged, etag)
+
+    paginator = NotificationPagination()
+    page = paginator.paginate_queryset(inbox_queryset(request), request)
+    serializer = NotificationSerializer(page, many=True, **fieldset_kwargs(request))
+    return response_cache.set_validators(paginator.get_paginated_response(serializer.data), etag)
+
+
+def inbox_queryset(request):
+    """request.user's notifications, loading what the request's fieldset renders."""
+    wanted = NotificationSerializer(**fieldset_kwargs(request))
+    qs = Notification.objects.filter(recipient=request.user)
+    # `summary` falls back to str(actor) when sample_actors is empty
+    if wanted.wants('actor') or wanted.wants('summary'):
+        qs = qs.select_related('actor')
+    if wanted.wants('recipient'):
+        qs = qs.select_related('recipient')
+    if wanted.wants('target'):
+        qs = qs.prefetch_related('target')
+    return narrow_queryset(qs, wanted, always=['timestamp'])
+
+
+def inbox_state():
+    # coalescing resurfaces a notification by moving its timestamp, deletes
+    # change the count and mark-read changes the unread count
+    return {'latest': Max('timestamp'), 'total': Count('pk'), 'unread': Count('pk', filter=Q(unread=True))}
+
+
+def inbox_etag(request, state):
+    return response_cache.make_etag(
+        'notifications', request.user.pk, state['latest'], state['total'], state['unread'],
+        request.build_absolute_uri(),
+    )
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_as_read(request, pk):
     n = get_object_or_404(Notification, pk=pk, recipient=request.user)
-    n.unread = False
-    n.save()
+    # only the flag changes: write one column instead of the whole row
+    Notification.objects.filter(pk=n.pk).update(unread=False)
+    hub.publish_on_commit([request.user.pk])  # open streams send the new unread count
     return Response({'detail': 'Marked as read.'})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_read_bulk(request):
+    """
+    POST /api/notifications/mark-read/
+    Expects one of:
+      { "ids": [1, 2, 3] }  -> mark these notifications read
+      { "up_to": 42 }       -> mark notification 42 and everything older
+                               (in listing order) read, e.g. "all caught up"
+    Runs a single UPDATE. Returns: { "marked": <rows changed> }
+    """
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    unread = Notification.objects.filter(recipient=request.user, unread=True)
+
+    if 'ids' in serializer.validated_data:
+        marked = unread.filter(pk__in=serializer.validated_data['ids']).update(unread=False)
+    else:
+        anchor = get_object_or_404(
+            Notification.objects.only('timestamp'), pk=serializer.validated_data['up_to'], recipient=request.user,
+        )
+        marked = unread.filter(
+            Q(timestamp__lt=anchor.timestamp) | Q(timestamp=anchor.timestamp, pk__lte=anchor.pk)
+        ).update(unread=False)
+
+    if marked:
+        hub.publish_on_commit([request.user.pk])
+    return Response({'marked': marked})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_count(request):
+    """
+    GET /api/notifications/unread-count/
+    Returns: { "unread": <n> }. Cheap enough to poll: the count is answered
+    from the partial index on (recipient) WHERE unread.
+    """
+    count = Notification.objects.filter(recipient=request.user, unread=True).count()
+    return Response({'unread': count})
@@ -0,0 +1,38 @@
+"""
+Async twin of the feed for ASGI deployments (see social_media_api.async_api).
+
+Same payload, response cache and ETag scheme as posts.views.feed; the
+large-author lookup and the page itself are read with the async ORM, so
+the request never occupies a worker thread; the response cache is read
+and written through the backend's async API (posts.cache a* helpers).
+"""
+from django.http import JsonResponse
+
+from social_media_api.async_api import async_api_view
+from social_media_api.fieldsets import fieldset_kwargs
+from . import cache as response_cache
+from .serializers import PostSerializer
+from .timeline import FeedPagination, alarge_followed_author_ids
+from .views import feed_posts
+
+
+@async_api_view
+async def feed(request):
+    """
+    GET /api/posts/async/feed/
+    Async version of GET /api/posts/feed/ (same parameters and response).
+    """
+    large_ids = await alarge_followed_author_ids(request.user)
+    version = await response_cache.afeed_version(request, large_ids)
+    page = await response_cache.aget_feed_page(request, version)
+    if page is None:
+        paginator = FeedPagination(request.user, large_ids)
+        posts = await paginator.apaginate_queryset(feed_posts(request), request)
+        # everything the serializer reads was loaded with the page
+        serializer = PostSerializer(posts, many=True, context={'request': request}, **fieldset_kwargs(request))
+        data = paginator.get_paginated_response(serializer.data).data
+        page = await response_cache.aset_feed_page(request, version, data, {post.author_id for post in posts})
+    unchanged = response_cache.not_modified(request, page['etag'])
+    if unchanged is not None:
+        return response_cache.set_validators(unchanged, page['etag'])
+    return response_cache.set_validators(JsonResponse(page['data']), page['etag'])
@@ -0,0 +1,285 @@
+"""
+Versioned response cache for the feed and the post list.
+
+Cached responses are never deleted. Instead every cache key embeds version
+stamps, and writes bump the relevant stamp so stale entries simply stop
+being addressed (and age out through RESPONSE_CACHE_TTL):
+
+  ver:user:<id>    - the viewer's feed: follow / unfollow, and every post
+                     fanned out into their timeline
+  ver:author:<id>  - an author's posts and their likes/comments
+  ver:posts        - anything shown by PostViewSet.list
+
+A feed page is addressed by the viewer's stamp plus the stamps of the large
+followed authors (whose posts are not fanned out), and the cached entry
+records the stamps of the authors on the page, so a like or comment on one
+of them makes it stale. A request reads a constant number of stamps
+however many accounts the viewer follows.
+
+The backend is whatever CACHES[RESPONSE_CACHE_ALIAS] points at (local
+memory in development, file-based or memcached in production).
+
+The same stamps double as HTTP validators: feed and post-list pages carry
+an ETag derived from them, so a polling client that sends If-None-Match
+gets a 304 without the page being looked up or serialized.
+
+The async views (posts.async_views) use the a*-prefixed twins of the feed
+helpers, which go through the cache backend's async API so a memcached or
+file-based round trip never blocks the event loop.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+POST_LIST_VERSION_KEY = 'ver:posts'
+HITS_KEY = 'stats:response-cache:hits'
+MISSES_KEY = 'stats:response-cache:misses'
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'RESPONSE_CACHE_TTL', 60)
+
+
+def user_version_key(user_id):
+    return f'ver:user:{user_id}'
+
+
+def author_version_key(author_id):
+    return f'ver:author:{author_id}'
+
+
+def _fresh_version():
+    # start from the clock rather than 1 so an evicted stamp never
+    # comes back at a value that old entries were stored under
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """Current stamp for every key, creating missing ones (one round trip when warm)."""
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return versions
+
+
+async def aget_versions(keys):
+    """get_versions() for async views."""
+    cache = _cache()
+    versions = await cache.aget_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return versions
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # stamp was never created or has been evicted
+        cache.set(key, _fresh_version(), timeout=None)
+
+
+def bump_versions(*keys):
+    """
+    Bump stamps now and again once the current transaction commits: a reader
+    that runs in between could otherwise re-cache pre-commit rows under the
+    new stamp.
+    """
+    def bump():
+        for key in keys:
+            _bump(key)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def invalidate_author(author_id):
+    """An author's posts, likes or comments changed."""
+    bump_versions(author_version_key(author_id), POST_LIST_VERSION_KEY)
+
+
+def invalidate_user(user_id):
+    """A user's follow graph changed."""
+    bump_versions(user_version_key(user_id))
+
+
+def _renew(keys):
+    cache = _cache()
+    # a fresh nanosecond stamp per key, all in one round trip
+    cache.set_many({key: time.time_ns() for key in keys}, timeout=None)
+
+
+def invalidate_feeds(user_ids):
+    """A post was fanned out into these users' timelines (many at once, so no incr per key)."""
+    keys = [user_version_key(user_id) for user_id in user_ids]
+    _renew(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _renew(keys))
+
+
+def _digest(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _feed_version_keys(request, large_ids):
+    return [user_version_key(request.user.pk)] + [author_version_key(pk) for pk in sorted(large_ids)]
+
+
+def feed_version(request, large_ids):
+    """Digest of the stamps that address one feed page: the viewer's and those of `large_ids`."""
+    keys = _feed_version_keys(request, large_ids)
+    versions = get_versions(keys)
+    return _digest(*(versions[key] for key in keys), request.build_absolute_uri())
+
+
+async def afeed_version(request, large_ids):
+    keys = _feed_version_keys(request, large_ids)
+    versions = await aget_versions(keys)
+    return _digest(*(versions[key] for key in keys), request.build_absolute_uri())
+
+
+def feed_cache_key(request, version):
+    return f'feed:{request.user.pk}:{version}'
+
+
+def _page_authors_digest(author_ids):
+    keys = [author_version_key(pk) for pk in author_ids]
+    versions = get_versions(keys)
+    return _digest(*(versions[key] for key in keys))
+
+
+async def _apage_authors_digest(author_ids):
+    keys = [author_version_key(pk) for pk in author_ids]
+    versions = await aget_versions(keys)
+    return _digest(*(versions[key] for key in keys))
+
+
+def get_feed_page(request, version):
+    """
+    The cached feed page for `version` as {'data', 'etag'}, or None when it
+    is missing or one of its authors changed since it was stored.
+    """
+    entry = _cache().get(feed_cache_key(request, version))
+    fresh = entry is not None and _page_authors_digest(entry['authors']) == entry['authors_version']
+    _count(fresh)
+    return entry if fresh else None
+
+
+async def aget_feed_page(request, version):
+    entry = await _cache().aget(feed_cache_key(request, version))
+    fresh = entry is not None and await _apage_authors_digest(entry['authors']) == entry['authors_version']
+    await _acount(fresh)
+    return entry if fresh else None
+
+
+def _feed_entry(version, data, author_ids, authors_version):
+    return {
+        'data': data,
+        'authors': author_ids,
+        'authors_version': authors_version,
+        'etag': make_etag('feed', version, authors_version),
+    }
+
+
+def set_feed_page(request, version, data, author_ids):
+    """
+    Cache a freshly built page. The author stamps are read after the page
+    was, so a like that lands in between can leave a stale entry, but only
+    until RESPONSE_CACHE_TTL.
+    """
+    author_ids = sorted(author_ids)
+    entry = _feed_entry(version, data, author_ids, _page_authors_digest(author_ids))
+    set_response(feed_cache_key(request, version), entry)
+    return entry
+
+
+async def aset_feed_page(request, version, data, author_ids):
+    author_ids = sorted(author_ids)
+    entry = _feed_entry(version, data, author_ids, await _apage_authors_digest(author_ids))
+    await _cache().aset(feed_cache_key(request, version), entry, timeout=_ttl())
+    return entry
+
+
+def post_list_version(request):
+    """Digest for one PostViewSet.list page (per viewer, because of `liked`)."""
+    version = get_versions([POST_LIST_VERSION_KEY])[POST_LIST_VERSION_KEY]
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    return _digest(version, user_id, request.build_absolute_uri())
+
+
+def post_list_cache_key(request, version):
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    return f'posts:{user_id}:{version}'
+
+
+def make_etag(*parts, weak=False):
+    return f'{"W/" if weak else ""}"{_digest(*parts)}"'
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's If-None-Match matches `etag`, else None."""
+    return get_conditional_response(request, etag=etag)
+
+
+def set_validators(response, etag):
+    """Attach `etag` and make clients revalidate instead of reusing the body blindly."""
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _count(hit):
+    cache = _cache()
+    stat = HITS_KEY if hit else MISSES_KEY
+    try:
+        cache.incr(stat)
+    except ValueError:
+        cache.add(stat, 1, timeout=None)
+
+
+async def _acount(hit):
+    cache = _cache()
+    stat = HITS_KEY if hit else MISSES_KEY
+    try:
+        await cache.aincr(stat)
+    except ValueError:
+        await cache.aadd(stat, 1, timeout=None)
+
+
+def get_response(key):
+    """Cached response data for `key`, or None. Counts hits and misses."""
+    data = _cache().get(key)
+    _count(data is not None)
+    return data
+
+
+def set_response(key, data):
+    _cache().set(key, data, timeout=_ttl())
+
+
+def stats():
+    counts = _cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'ttl': _ttl(),
+    }
@@ -0,0 +1,364 @@
+"""
+Write-buffered post counters (likes_count, views_count).
+
+With POST_COUNTER_BUFFER['ENABLED'] every increment is added to an
+in-process buffer instead of issuing its own UPDATE against the post row.
+The buffer is flushed when it holds MAX_PENDING increments or
+FLUSH_INTERVAL seconds after the first unflushed one, as a single
+
+    UPDATE posts_post
+       SET likes_count = likes_count + CASE id WHEN 1 THEN 3 ... ELSE 0 END,
+           views_count = views_count + CASE id WHEN 1 THEN 40 ... ELSE 0 END
+     WHERE id IN (...)
+
+so a viral post costs one write per flush instead of one per request.
+
+Durability: every increment is appended to a JSON-lines journal in
+JOURNAL_DIR before it is buffered. A flush first rotates the journal, then
+applies the UPDATE, then deletes the rotated file. Journals left behind by
+a worker that died (nobody holds their lock any more) are replayed by the
+next process that starts the buffer. Replay is at-least-once: a crash
+between the UPDATE and the delete re-applies that batch.
+
+Disabled (the default), `incr()` writes likes straight through with
+Post.bump_counter and drops views: a view is a read, and a synchronous
+UPDATE per read would serialize a hot post's readers on its row. Buffered
+increments are invisible to readers until they are flushed.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Post
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals are still written, orphans are not claimed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('likes_count', 'views_count')
+# only counted through the buffer, never written straight through
+BUFFERED_ONLY = ('views_count',)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL': 2.0,
+    'MAX_PENDING': 1000,
+    'JOURNAL_DIR': None,
+}
+
+
+def buffer_settings():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POST_COUNTER_BUFFER', {}))
+    if options['JOURNAL_DIR'] is None:
+        options['JOURNAL_DIR'] = os.path.join(settings.BASE_DIR, 'var', 'counters')
+    return options
+
+
+def apply_deltas(deltas):
+    """
+    Apply {(post_id, field): delta} in one UPDATE. Counters never go below zero.
+    Returns the number of rows updated.
+    """
+    post_ids = sorted({post_id for post_id, _ in deltas})
+    if not post_ids:
+        return 0
+    changes = {}
+    for field in FIELDS:
+        whens = [
+            When(pk=post_id, then=Value(deltas[(post_id, field)]))
+            for post_id in post_ids if deltas.get((post_id, field))
+        ]
+        if whens:
+            step = Case(*whens, default=Value(0), output_field=IntegerField())
+            changes[field] = Greatest(F(field) + step, Value(0))
+    if not changes:
+        return 0
+    return Post.objects.filter(pk__in=post_ids).update(**changes)
+
+
+class Journal:
+    """Append-only JSON-lines log of one process's unflushed increments."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'counters-{os.getpid()}.jsonl')
+        self._file = None
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            # held for the life of the process; lets others tell live journals from orphans
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, post_id, field, delta):
+        self._file.write(json.dumps([post_id, field, delta]) + '\n')
+        self._file.flush()
+
+    def rotate(self):
+        """
+        Start a fresh journal file. Returns (path, file) of the old one, which
+        stays open (and locked) until the flush that covers it succeeds.
+        """
+        rotated = f'{self.path}.{time.time_ns()}.flushing'
+        old = self._file
+        if fcntl is None:
+            old.close()
+        os.replace(self.path, rotated)
+        self._open()
+        return rotated, old
+
+    @staticmethod
+    def discard(rotated):
+        path, fh = rotated
+        fh.close()
+        os.remove(path)
+
+    def close(self):
+        self._file.close()
+        if os.path.exists(self.path) and os.path.getsize(self.path) == 0:
+            os.remove(self.path)
+
+
+def read_journal(path):
+    deltas = {}
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                post_id, field, delta = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            if field in FIELDS:
+                deltas[(post_id, field)] = deltas.get((post_id, field), 0) + delta
+    return deltas
+
+
+def unflushed_deltas():
+    """
+    Every increment still waiting in a journal (live workers' buffers,
+    flushes in progress and orphans awaiting replay) as
+    {(post_id, field): delta}. Counter repairs subtract these: the likes are
+    already rows, but their increments have not reached the column yet.
+    """
+    deltas = {}
+    for path in glob.glob(os.path.join(buffer_settings()['JOURNAL_DIR'], 'counters-*.jsonl*')):
+        try:
+            journal = read_journal(path)
+        except FileNotFoundError:
+            continue  # flushed and removed while we were listing
+        for key, delta in journal.items():
+            deltas[key] = deltas.get(key, 0) + delta
+    return deltas
+
+
+def recover_journals(directory):
+    """
+    Replay journals in `directory` that no live process holds. Returns the
+    number of files replayed.
+    """
+    if fcntl is None:
+        return 0
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'counters-*.jsonl*'))):
+        with open(path, 'a', encoding='utf-8') as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # a running worker's journal
+            deltas = read_journal(path)
+            with transaction.atomic():
+                apply_deltas(deltas)
+        os.remove(path)
+        replayed += 1
+    if replayed:
+        logger.info('Replayed %d post counter journal(s) from %s', replayed, directory)
+    return replayed
+
+
+class CounterBuffer:
+    def __init__(self, flush_interval, max_pending, journal_dir):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._pending_count = 0
+        self._oldest = None  # monotonic time of the oldest unflushed increment
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._rotated = []  # journal files whose increments are not in the database yet
+        self.flushes = 0
+        self.flushed_increments = 0
+        self.last_flush_at = None
+        self.last_flush_lag = None
+        self.last_flush_duration = None
+        os.makedirs(journal_dir, exist_ok=True)
+        # before opening our own journal: a previous worker may have had our pid
+        recover_journals(journal_dir)
+        self.journal = Journal(journal_dir)
+
+    def incr(self, post_id, field, delta=1):
+        with self._lock:
+            self.journal.append(post_id, field, delta)
+            key = (post_id, field)
+            self._pending[key] = self._pending.get(key, 0) + delta
+            self._pending_count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._schedule()
+            full = self._pending_count >= self.max_pending
+        if full:
+            self.flush()
+
+    def _schedule(self):
+        if self.flush_interval and self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Post counter flush failed; increments kept for the next attempt')
+        finally:
+            connection.close()  # the timer thread's own connection
+
+    def flush(self):
+        """Write every buffered increment in one UPDATE. Returns the rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._pending:
+                    return 0
+                pending, count, oldest = self._pending, self._pending_count, self._oldest
+                self._pending, self._pending_count, self._oldest = {}, 0, None
+                self._rotated.append(self.journal.rotate())
+
+            started = time.monotonic()
+            try:
+                with transaction.atomic():
+                    updated = apply_deltas(pending)
+            except Exception:
+                self._restore(pending, count, oldest)
+                raise
+            for rotated in self._rotated:
+                Journal.discard(rotated)
+            self._rotated = []
+
+            finished = time.monotonic()
+            self.flushes += 1
+            self.flushed_increments += count
+            self.last_flush_at = time.time()
+            self.last_flush_lag = finished - oldest
+            self.last_flush_duration = finished - started
+            return updated
+
+    def _restore(self, pending, count, oldest):
+        # the rotated journal still holds these; re-buffer them so the next flush
+        # retries (and then drops that journal too)
+        with self._lock:
+            for key, delta in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + delta
+            self._pending_count += count
+            self._oldest = min(oldest, self._oldest or oldest)
+            self._schedule()
+
+    def stats(self):
+        with self._lock:
+            lag = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+            return {
+                'enabled': True,
+                'pending_increments': self._pending_count,
+                'pending_rows': len({post_id for post_id, _ in self._pending}),
+                'flush_lag': round(lag, 3),  # age of the oldest unflushed increment (s)
+                'last_flush_lag': self.last_flush_lag and round(self.last_flush_lag, 3),
+                'last_flush_duration': self.last_flush_duration and round(self.last_flush_duration, 4),
+                'last_flush_at': self.last_flush_at,
+                'flushes': self.flushes,
+                'flushed_increments': self.flushed_increments,
+            }
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.journal.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The process's CounterBuffer, or None when buffering is disabled."""
+    global _buffer
+    options = buffer_settings()
+    if not options['ENABLED']:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = CounterBuffer(
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    max_pending=options['MAX_PENDING'],
+                    journal_dir=options['JOURNAL_DIR'],
+                )
+    return _buffer
+
+
+def incr(post_id, field, delta=1):
+    """Add `delta` to a post counter, buffered or written straight through (see BUFFERED_ONLY)."""
+    buffer = get_buffer()
+    if buffer is None:
+        if field in BUFFERED_ONLY:
+            return
+        Post.objects.filter(pk=post_id).bump_counter(field, delta)
+    else:
+        # only buffer work that actually committed
+        transaction.on_commit(lambda: buffer.incr(post_id, field, delta))
+
+
+def flush():
+    buffer = get_buffer()
+    return buffer.flush() if buffer is not None else 0
+
+
+def stats():
+    buffer = get_buffer()
+    return buffer.stats() if buffer is not None else {'enabled': False}
+
+
+def shutdown():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            _buffer = None
+
+
+atexit.register(shutdown)
+
+
+def _reset_on_setting_change(setting, **kwargs):
+    if setting == 'POST_COUNTER_BUFFER':
+        shutdown()
+
+
+setting_changed.connect(_reset_on_setting_change, dispatch_uid='posts_counter_buffer_reset')
@@ -0,0 +1,137 @@
+"""
+Set-based like/unlike writes.
+
+Every operation is a fixed number of statements regardless of how many
+posts it touches, and relies on the unique (user, post) constraint rather
+than a read-before-write:
+
+  1. INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING post_id
+     (the SELECT skips missing posts and the user's own posts), or
+     DELETE ... RETURNING post_id
+  2. UPDATE posts_post SET likes_count = ... RETURNING id, author_id,
+     only for the rows that actually changed (with POST_COUNTER_BUFFER
+     enabled, a read of the authors instead; posts.counters batches the
+     UPDATE)
+  3. one outbox insert for the new likes
+
+RETURNING / ON CONFLICT need PostgreSQL or SQLite >= 3.35.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.utils import timezone
+
+from notifications.models import NotificationOutbox
+
+from . import cache as response_cache
+from . import counters
+from .models import Like, Post
+
+LIKE_VERB = 'liked your post'
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _insert_likes(user_id, post_ids):
+    like_table = Like._meta.db_table
+    post_table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {like_table} (user_id, post_id, created_at) '
+            f'SELECT %s, id, %s FROM {post_table} '
+            f'WHERE id IN ({_placeholders(post_ids)}) AND author_id <> %s '
+            f'ON CONFLICT (user_id, post_id) DO NOTHING '
+            f'RETURNING post_id',
+            [user_id, timezone.now(), *post_ids, user_id],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _delete_likes(user_id, post_ids):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Like._meta.db_table} '
+            f'WHERE user_id = %s AND post_id IN ({_placeholders(post_ids)}) '
+            f'RETURNING post_id',
+            [user_id, *post_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _bump_likes(post_ids, delta):
+    """Add `delta` to likes_count (never below zero); returns {post_id: author_id}."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Post._meta.db_table} '
+            f'SET likes_count = CASE WHEN likes_count + %s < 0 THEN 0 ELSE likes_count + %s END '
+            f'WHERE id IN ({_placeholders(post_ids)}) '
+            f'RETURNING id, author_id',
+            [delta, delta, *post_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def _change_likes(post_ids, delta):
+    """Apply `delta` to the posts' likes_count; returns {post_id: author_id}."""
+    if counters.get_buffer() is None:
+        return _bump_likes(post_ids, delta)
+    for post_id in post_ids:
+        counters.incr(post_id, 'likes_count', delta)
+    return dict(Post.objects.filter(pk__in=post_ids).values_list('pk', 'author_id'))
+
+
+def _queue_notifications(actor, authors):
+    post_type = ContentType.objects.get_for_model(Post)  # cached per process
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            recipient_id=author_id, actor=actor, verb=LIKE_VERB,
+            target_content_type=post_type, target_object_id=post_id,
+        )
+        for post_id, author_id in authors.items()
+    ])
+
+
+def like(user, post_ids):
+    """
+    Like every post in `post_ids` that exists, is not the user's own and is
+    not liked yet. Returns the ids that were newly liked.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return []
+    liked = _insert_likes(user.pk, post_ids)
+    if liked:
+        authors = _change_likes(liked, 1)
+        _queue_notifications(user, authors)
+        for author_id in set(authors.values()):
+            response_cache.invalidate_author(author_id)
+    return liked
+
+
+def unlike(user, post_ids):
+    """Remove the user's likes on `post_ids`. Returns the ids that were unliked."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return []
+    unliked = _delete_likes(user.pk, post_ids)
+    if unliked:
+        authors = _change_likes(unliked, -1)
+        for author_id in set(authors.values()):
+            response_cache.invalidate_author(author_id)
+    return unliked
+
+
+def sync(user, operations):
+    """
+    Apply a batch of {"post": id, "action": "like" | "unlike"} operations.
+    Operations on the same post collapse to the last one, so an offline
+    like/unlike/like burst costs the same as a single like. Call inside a
+    transaction.
+    """
+    final = {}
+    for operation in operations:
+        final[operation['post']] = operation['action']
+    to_like = [post_id for post_id, action in final.items() if action == 'like']
+    to_unlike = [post_id for post_id, action in final.items() if action == 'unlike']
+    return {'liked': like(user, to_like), 'unliked': unlike(user, to_unlike)}
@@ -0,0 +1,179 @@
+"""
+Synthetic data for load testing (`manage.py seed_load`, `manage.py bench_endpoints`).
+
+The social graph is skewed the way real ones are: out-degrees (how many
+accounts a user follows) are Pareto-distributed around `follows_per_user`,
+and follow targets, like targets and post authors are drawn with Zipf
+weights, so a handful of accounts and posts collect most of the followers
+and likes. Everything is written with bulk_create; denormalized counters
+and the search index are then rebuilt with the existing repair commands.
+"""
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import graph
+from notifications.models import Notification
+from .models import Comment, Like, Post, TimelineEntry
+from .timeline import fanout_max_followers
+
+User = get_user_model()
+
+PASSWORD = 'loadtest'
+
+WORDS = (
+    'django query index cache feed post like follow comment timeline python '
+    'latency throughput sqlite postgres cursor page signal batch write read '
+    'viral trending weekend coffee music travel photo morning update news'
+).split()
+
+# Named dataset sizes for bench_endpoints; every count scales with `users`.
+SIZES = {
+    'small': {'users': 200, 'posts': 1000},
+    'medium': {'users': 2000, 'posts': 10000},
+    'large': {'users': 10000, 'posts': 50000},
+}
+
+
+def zipf_weights(n, exponent=1.1):
+    """Cumulative weights for picking index i with probability ~ 1 / (i + 1)^exponent."""
+    cumulative, total = [], 0.0
+    for rank in range(n):
+        total += 1.0 / (rank + 1) ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _spread(count, span):
+    """`count` timestamps spread over the last `span`, oldest first."""
+    now = timezone.now()
+    step = span / max(count, 1)
+    return [now - span + step * i for i in range(count)]
+
+
+def seed(users=1000, posts=5000, follows_per_user=20, likes=None, comments=None,
+         prefix='load', seed=0, batch_size=1000, log=None):
+    """
+    Create the dataset and return a dict of row counts per table.
+    `likes` and `comments` default to 4x and 1x `posts`.
+    """
+    rng = random.Random(seed)
+    likes = posts * 4 if likes is None else likes
+    comments = posts if comments is None else comments
+    log = log or (lambda message: None)
+    created = {}
+
+    with transaction.atomic():
+        # users: hashing once keeps this from being dominated by PBKDF2
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password)
+             for i in range(users)],
+            batch_size=batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=f'{prefix}_user_').order_by('pk').values_list('pk', flat=True)
+        )
+        created['users'] = len(user_ids)
+        log(f'users: {len(user_ids)}')
+
+        # follows: popular accounts are early in `user_ids`
+        popularity = zipf_weights(len(user_ids))
+        followers_of = {uid: [] for uid in user_ids}
+        edges = []
+        for follower in user_ids:
+            degree = min(len(user_ids) - 1, int(follows_per_user / 3 * rng.paretovariate(1.5)))
+            targets = set(rng.choices(user_ids, cum_weights=popularity, k=degree))
+            targets.discard(follower)
+            for target in targets:
+                followers_of[target].append(follower)
+                # (from_user=A, to_user=B) means "B follows A"
+                edges.append(graph.Follow(from_user_id=target, to_user_id=follower))
+        graph.Follow.objects.bulk_create(edges, batch_size=batch_size, ignore_conflicts=True)
+        created['follows'] = len(edges)
+        log(f'follows: {len(edges)}')
+
+        # posts: prolific authors are the popular ones too
+        authors = rng.choices(user_ids, cum_weights=popularity, k=posts)
+        timestamps = _spread(posts, timedelta(days=30))
+        new_posts = Post.objects.bulk_create(
+            [Post(author_id=author, title=_text(rng, 4), content=_text(rng, 30)) for author in authors],
+            batch_size=batch_size,
+        )
+        for post, created_at in zip(new_posts, timestamps):
+            post.created_at = post.updated_at = created_at  # auto_now(_add) stamped them all "now"
+        Post.objects.bulk_update(new_posts, ['created_at', 'updated_at'], batch_size=batch_size)
+        created['posts'] = len(new_posts)
+        log(f'posts: {len(new_posts)}')
+
+        # home timelines, the way fan_out_post would have filled them
+        threshold = fanout_max_followers()
+        entries = [
+            TimelineEntry(user_id=follower, post_id=post.pk, post_created_at=post.created_at)
+            for post in new_posts if len(followers_of[post.author_id]) <= threshold
+            for follower in followers_of[post.author_id]
+        ]
+        TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+        created['timeline_entries'] = len(entries)
+        log(f'timeline entries: {len(entries)}')
+
+        # likes and comments concentrate on popular (here: newest-first zipf) posts
+        hot_posts = list(reversed(new_posts))
+        post_weights = zipf_weights(len(hot_posts))
+        post_type = ContentType.objects.get_for_model(Post)
+        usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username'))
+        notifications = []
+
+        def notify(recipient, actor, verb, target_id=None, target_type=None):
+            notifications.append(Notification(
+                recipient_id=recipient, actor_id=actor, verb=verb,
+                target_content_type=target_type, target_object_id=target_id,
+                unread=rng.random() < 0.5,
+                sample_actors=[{'id': actor, 'username': usernames[actor]}],
+            ))
+
+        like_pairs = set()
+        for post in rng.choices(hot_posts, cum_weights=post_weights, k=likes):
+            user = rng.choice(user_ids)
+            if user != post.author_id and (user, post.pk) not in like_pairs:
+                like_pairs.add((user, post.pk))
+                notify(post.author_id, user, 'liked your post', post.pk, post_type)
+        Like.objects.bulk_create(
+            [Like(user_id=user, post_id=post_id) for user, post_id in like_pairs],
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        created['likes'] = len(like_pairs)
+        log(f'likes: {len(like_pairs)}')
+
+        new_comments = []
+        for post in rng.choices(hot_posts, cum_weights=post_weights, k=comments):
+            user = rng.choice(user_ids)
+            new_comments.append(Comment(post_id=post.pk, author_id=user, content=_text(rng, 12)))
+            if user != post.author_id:
+                notify(post.author_id, user, 'commented on your post', post.pk, post_type)
+        Comment.objects.bulk_create(new_comments, batch_size=batch_size)
+        created['comments'] = len(new_comments)
+        log(f'comments: {len(new_comments)}')
+
+        for edge in edges:
+            notify(edge.from_user_id, edge.to_user_id, 'started following you')
+        Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        created['notifications'] = len(notifications)
+        log(f'notifications: {len(notifications)}')
+
+    # bulk_create bypasses the counter write paths and the search signals
+    call_command('sync_follow_counts', stdout=StringIO())
+    call_command('sync_post_counters', stdout=StringIO())
+    call_command('rebuild_search_index', stdout=StringIO())
+    return created
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts import graph
+from posts.loadgen import SIZES, seed
+from posts.models import Post
+
+User = get_user_model()
+
+ENDPOINTS = ('feed', 'post_list', 'post_detail', 'like', 'follow', 'notifications')
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return float('nan')
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints against freshly seeded temporary databases "
+        "of several sizes; reports p50/p95/p99 latency and queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f"Comma-separated dataset sizes: {', '.join(SIZES)} or USERS:POSTS (default: small,medium).")
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Measured requests per endpoint (default: 50).')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Unmeasured requests per endpoint first (default: 5).')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}.")
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='Clear the response cache before every request.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON lines.')
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+        sizes = [self._parse_size(size) for size in options['sizes'].split(',') if size.strip()]
+
+        setup_test_environment()  # 'testserver' host, in-memory mail, ...
+        try:
+            if not options['json']:
+                self.stdout.write(f"{'size':<14} {'endpoint':<14} {'p50 ms':>8} {'p95 ms':>8} "
+                                  f"{'p99 ms':>8} {'queries':>8} {'max q':>6}")
+            for label, dimensions in sizes:
+                for result in self._run_size(label, dimensions, endpoints, options):
+                    self._report(result, options['json'])
+        finally:
+            teardown_test_environment()
+
+    def _parse_size(self, size):
+        size = size.strip()
+        if size in SIZES:
+            return size, SIZES[size]
+        try:
+            users, posts = (int(part) for part in size.split(':'))
+        except ValueError:
+            raise CommandError(f"Bad size {size!r}: use {', '.join(SIZES)} or USERS:POSTS")
+        return size, {'users': users, 'posts': posts}
+
+    def _run_size(self, label, dimensions, endpoints, options):
+        """Seed a throwaway test database, measure, then drop it."""
+        workdir = None
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_test_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            # a real file, so the sqlite pragmas (and WAL, with SQLITE_WAL=1) behave as in production
+            workdir = tempfile.mkdtemp(prefix='bench-')
+            test_settings['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stderr.write(f"Seeding {label} ({dimensions['users']} users, {dimensions['posts']} posts)...")
+            seed(users=dimensions['users'], posts=dimensions['posts'], seed=options['seed'])
+            # ids repeat between sizes: drop cached graph sets and pages of the previous one
+            caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')].clear()
+            return [
+                dict(size=label, endpoint=name, **self._measure(name, options))
+                for name in endpoints
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def _client_for(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def _requests(self, name, count):
+        """`count` (client, method, path) tuples for one endpoint."""
+        heavy_reader = User.objects.order_by('-following_count').first()
+        if name in ('feed', 'post_list'):
+            path = '/api/posts/feed/' if name == 'feed' else '/api/posts/posts/'
+            client = self._client_for(heavy_reader)
+            return [(client, 'get', path)] * count
+        if name == 'post_detail':
+            client = self._client_for(heavy_reader)
+            hot = list(Post.objects.order_by('-likes_count').values_list('pk', flat=True)[:count])
+            return [(client, 'get', f'/api/posts/posts/{hot[i % len(hot)]}/') for i in range(count)]
+        if name == 'like':
+            client = self._client_for(heavy_reader)
+            targets = (
+                Post.objects.exclude(author=heavy_reader).exclude(likes__user=heavy_reader)
+                .order_by('-likes_count').values_list('pk', flat=True)[:count]
+            )
+            return [(client, 'post', f'/api/posts/posts/{pk}/like/') for pk in targets]
+        if name == 'follow':
+            client = self._client_for(heavy_reader)
+            targets = (
+                User.objects.exclude(pk=heavy_reader.pk).exclude(pk__in=graph.following_queryset(heavy_reader.pk))
+                .order_by('-followers_count').values_list('pk', flat=True)[:count]
+            )
+            return [(client, 'post', f'/api/accounts/follow/{pk}/') for pk in targets]
+        # notifications: the most-notified account
+        recipient = User.objects.annotate(total=Count('notifications')).order_by('-total').first()
+        return [(self._client_for(recipient), 'get', '/api/notifications/')] * count
+
+    def _measure(self, name, options):
+        cache = caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+        requests = self._requests(name, options['warmup'] + options['iterations'])
+        latencies, queries = [], []
+        for i, (client, method, path) in enumerate(requests):
+            if options['cold_cache']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = getattr(client, method)(path)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(f'{name}: {method.upper()} {path} -> {response.status_code}')
+            if i >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                queries.append(len(ctx.captured_queries))
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_median': statistics.median(queries) if queries else float('nan'),
+            'queries_max': max(queries, default=0),
+        }
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result))
+            return
+        self.stdout.write(
+            f"{result['size']:<14} {result['endpoint']:<14} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['queries_median']:>8g} {result['queries_max']:>6}"
+        )
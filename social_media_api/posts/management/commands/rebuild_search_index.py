@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import INDEXES, get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for posts and comments from scratch."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        for model in INDEXES:
+            indexed = backend.rebuild(model)
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: {indexed} rows indexed ({type(backend).__name__})."
+            ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.loadgen import PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic social graph (users, power-law follows, posts, likes, comments, notifications) for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--follows-per-user', type=int, default=20,
+                            help='Mean number of accounts each user follows (default: 20).')
+        parser.add_argument('--likes', type=int, default=None, help='Default: 4 x posts.')
+        parser.add_argument('--comments', type=int, default=None, help='Default: 1 x posts.')
+        parser.add_argument('--prefix', default='load',
+                            help='Usernames are <prefix>_user_<n>; use a new prefix to seed again.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT (default: 1000).')
+
+    def handle(self, *args, **options):
+        created = seed(
+            users=options['users'],
+            posts=options['posts'],
+            follows_per_user=options['follows_per_user'],
+            likes=options['likes'],
+            comments=options['comments'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f'{count} {table}' for table, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}. Password for every user: '{PASSWORD}'."))
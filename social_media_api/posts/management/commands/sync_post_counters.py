@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from posts import counters
+from posts.models import Comment, Like, Post, _count_per_post
+
+
+def _pending_likes():
+    """{post_id: delta} of likes_count increments still in a write buffer's journal."""
+    pending = {}
+    for (post_id, field), delta in counters.unflushed_deltas().items():
+        if field == 'likes_count' and delta:
+            pending[post_id] = delta
+    return pending
+
+
+def _actual_likes(pending):
+    """
+    What likes_count should hold: the post's Like rows minus the increments
+    still pending (those likes are rows already, and the next flush adds
+    them to the column).
+    """
+    likes = _count_per_post(Like)
+    if not pending:
+        return likes
+    step = Case(*[When(pk=pk, then=Value(delta)) for pk, delta in pending.items()],
+                default=Value(0), output_field=IntegerField())
+    return Greatest(likes - step, Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.likes_count / comments_count from the like and comment tables and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Posts checked per batch (default: 1000).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without writing anything.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            # walk the table by primary key range so every batch is an index scan
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .annotate(actual_likes=_actual_likes(_pending_likes()), actual_comments=_count_per_post(Comment))
+                .only('pk', 'likes_count', 'comments_count')[:batch_size]
+            )
+            if not batch:
+                break
+            first_pk, last_pk = batch[0].pk, batch[-1].pk
+            checked += len(batch)
+
+            drifted = [
+                post for post in batch
+                if post.likes_count != post.actual_likes or post.comments_count != post.actual_comments
+            ]
+            for post in drifted:
+                self.stdout.write(
+                    f"Post {post.pk}: likes {post.likes_count} -> {post.actual_likes}, "
+                    f"comments {post.comments_count} -> {post.actual_comments}"
+                )
+            if not drifted or dry_run:
+                repaired += len(drifted)
+                continue
+
+            # the counts are recomputed inside the UPDATE, so a like or comment
+            # that lands after the read above is not overwritten
+            with transaction.atomic():
+                in_range = Post.objects.filter(pk__gte=first_pk, pk__lte=last_pk)
+                # lock the range before reading the journals, so no buffer flush
+                # applies increments between the read and the UPDATE
+                list(in_range.select_for_update().values_list('pk'))
+                pending = {pk: delta for pk, delta in _pending_likes().items() if first_pk <= pk <= last_pk}
+                actual_likes, actual_comments = _actual_likes(pending), _count_per_post(Comment)
+                repaired += in_range.filter(
+                    ~Q(likes_count=actual_likes) | ~Q(comments_count=actual_comments)
+                ).update(likes_count=actual_likes, comments_count=actual_comments)
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, {repaired} {verb}."))
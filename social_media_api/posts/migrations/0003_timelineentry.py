@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Fill every follower's timeline with the recent posts of the authors they follow."""
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = User.followers.through
+    max_followers = getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 10000)
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+    # a row (from_user=A, to_user=B) means "B follows A"; large authors are read on demand
+    authors = (
+        Follow.objects.order_by().values('from_user')
+        .annotate(total=Count('pk')).filter(total__lte=max_followers)
+        .values_list('from_user', flat=True)
+    )
+    for author_id in authors.iterator(chunk_size=BATCH_SIZE):
+        recent = list(
+            Post.objects.filter(author_id=author_id).order_by('-created_at', '-id')
+            .values_list('pk', 'created_at')[:limit]
+        )
+        if not recent:
+            continue
+        entries = []
+        follower_ids = Follow.objects.filter(from_user_id=author_id).values_list('to_user_id', flat=True)
+        for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+            entries += [
+                TimelineEntry(user_id=follower_id, post_id=post_id, post_created_at=created_at)
+                for post_id, created_at in recent
+            ]
+            if len(entries) >= BATCH_SIZE:
+                TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+                entries = []
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_like'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-post_created_at', '-post'], name='timeline_user_recent_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
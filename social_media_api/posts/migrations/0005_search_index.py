@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# FTS5 tables backing posts.search.SQLiteFTS5Backend; rowid is the object's id.
+FTS_TABLES = {
+    'posts_post_fts': ('posts_post', 'title, content'),
+    'posts_comment_fts': ('posts_comment', 'content'),
+}
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return  # Postgres searches with tsvector; other databases fall back to LIKE
+    for table, (source, columns) in FTS_TABLES.items():
+        schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns})')
+        schema_editor.execute(f'INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {source}')
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in FTS_TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
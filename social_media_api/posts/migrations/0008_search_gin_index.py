@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# GIN indexes backing posts.search.PostgresSearchBackend. Each expression
+# must stay identical to posts.search.tsvector_sql(columns), or the planner
+# will not match the query to it.
+GIN_INDEXES = {
+    'posts_post_search_idx': ('posts_post', ('title', 'content')),
+    'posts_comment_search_idx': ('posts_comment', ('content',)),
+}
+CONFIG = 'english'
+
+
+def tsvector_sql(columns):
+    document = " || ' ' || ".join(f"coalesce(\"{column}\", '')" for column in columns)
+    return f"to_tsvector('{CONFIG}', {document})"
+
+
+def create_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return  # SQLite searches its FTS5 tables (0005); other databases fall back to LIKE
+    for name, (table, columns) in GIN_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING GIN (({tsvector_sql(columns)}))')
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in GIN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_author_recent_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
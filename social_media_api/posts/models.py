@@ -1,5 +1,67 @@
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count_per_post(model):
+    """Correlated `SELECT COUNT(*) ... WHERE post_id = posts_post.id` subquery."""
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class PostQuerySet(models.QuerySet):
+    def with_stats(self, user=None, fields=None):
+        """
+        Everything PostSerializer needs, fetched up front so a page of posts
+        costs a constant number of queries:
+          - is_liked: EXISTS subquery for `user`
+          - author loaded with a join
+          - comments_preview: the latest COMMENTS_PREVIEW_SIZE comments of
+            every post on the page, in one windowed (ROW_NUMBER) query
+        Like/comment totals are the denormalized likes_count/comments_count columns.
+
+        `fields` (serializer field names, None for all) skips the parts a
+        sparse fieldset does not render.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        qs = self
+        if wanted('author'):
+            qs = qs.select_related('author')
+        if wanted('comments_preview'):
+            preview_size = getattr(settings, 'COMMENTS_PREVIEW_SIZE', 3)
+            # a sliced Prefetch is emitted as a single ROW_NUMBER() OVER (PARTITION BY post_id) query
+            latest = Comment.objects.select_related('author').order_by('-created_at', '-id')[:preview_size]
+            qs = qs.prefetch_related(Prefetch('comments', queryset=latest, to_attr='comments_preview'))
+        if wanted('liked'):
+            if user is not None and user.is_authenticated:
+                liked = Exists(Like.objects.filter(post=OuterRef('pk'), user=user))
+            else:
+                liked = Value(False, output_field=models.BooleanField())
+            qs = qs.annotate(is_liked=liked)
+        return qs
+
+    def with_actual_counts(self):
+        """Annotate the real row counts, used to detect counter drift."""
+        return self.annotate(
+            actual_comments=_count_per_post(Comment),
+            actual_likes=_count_per_post(Like),
+        )
+
+    def bump_counter(self, field, delta):
+        """
+        Atomically add `delta` to a counter column (UPDATE ... SET f = f + delta).
+        Decrements never take a counter below zero.
+        """
+        qs = self
+        if delta < 0:
+            qs = qs.filter(**{f'{field}__gte': -delta})
+        return qs.update(**{field: F(field) + delta})
 
 
 class Post(models.Model):
@@ -13,6 +75,22 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # denormalized counters, kept in step by the like/comment write paths
+    # (repair drift with `manage.py sync_post_counters`)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # detail views; like likes_count it may be write-buffered (posts.counters)
+    views_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # one author's posts newest first: large authors' posts are
+            # merged into feeds at read time (posts.timeline.FeedPagination)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -56,3 +134,32 @@ class Like(models.Model):
     def __str__(self):
         return f"{self.user} liked post {self.post_id}"
 
+
+
+class TimelineEntry(models.Model):
+    """
+    One row per (follower, post): the materialized home timeline.
+    Filled on post creation (fan-out-on-write) and on follow (backfill),
+    pruned on unfollow. `post_created_at` is copied from the post so the
+    feed can be read as a single index range per user.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post_created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-post_created_at', '-post'], name='timeline_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Timeline entry for {self.user_id}: post {self.post_id}"
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on (cursor_field, id), newest first.
+
+    Unlike PageNumberPagination it never runs COUNT(*) and never uses OFFSET:
+    each page is a single `WHERE (field, id) < (value, pk) ... LIMIT n + 1`
+    range read, so page 10,000 costs the same as page 1. Ties on
+    `cursor_field` are broken by the primary key, which keeps cursors stable
+    while rows are being inserted.
+
+    Set `cursor_field = None` to paginate on the primary key alone. Querysets
+    annotated with `rank_field` (full-text search results) are paged by
+    relevance instead.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    cursor_field = 'created_at'
+    rank_field = 'search_rank'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = self.get_cursor_field(queryset, view)
+        self.cursor = self.decode_cursor(request, queryset)
+
+        rows = list(self.get_page_queryset(queryset)[:self.page_size + 1])
+        return self.finish_page(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: the page is read with aiterator()."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = self.get_cursor_field(queryset, view)
+        self.cursor = self.decode_cursor(request, queryset)
+
+        page = self.get_page_queryset(queryset)[:self.page_size + 1]
+        # chunk_size is required for prefetch_related() to apply
+        rows = [row async for row in page.aiterator(chunk_size=self.page_size + 1)]
+        return self.finish_page(rows)
+
+    def get_cursor_field(self, queryset, view):
+        if self.rank_field and self.rank_field in queryset.query.annotations:
+            return self.rank_field
+        return self.cursor_field
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_page_queryset(self, queryset):
+        """Apply the keyset range and ordering for the current cursor."""
+        return self.keyset(queryset, self.field)
+
+    def keyset(self, queryset, field, pk_field='pk'):
+        """
+        Order `queryset` by (field, pk_field) and cut it at the current cursor.
+        Tables that hold copies of the keys (e.g. TimelineEntry's
+        post_created_at / post_id) can be cut by the same cursor.
+        """
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        keys = [field, pk_field] if field else [pk_field]
+        # forward pages walk newest -> oldest; reverse pages walk back up
+        ordering = keys if reverse else ['-%s' % key for key in keys]
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor is None:
+            return queryset
+
+        op = 'gt' if reverse else 'lt'
+        pk_cond = Q(**{'%s__%s' % (pk_field, op): self.cursor['pk']})
+        if not field:
+            return queryset.filter(pk_cond)
+        value = self.cursor['value']
+        # the redundant `field <= value` bound lets the index seek straight
+        # to the cursor instead of scanning down to it from the first row
+        return queryset.filter(
+            Q(**{'%s__%se' % (field, op): value}),
+            Q(**{'%s__%s' % (field, op): value}) | (Q(**{field: value}) & pk_cond),
+        )
+
+    def finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.cursor and self.cursor['reverse']:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    # -- cursor encoding ---------------------------------------------------
+
+    def _field_for(self, queryset):
+        annotation = queryset.query.annotations.get(self.field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(self.field)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii'))
+            value, pk, reverse = json.loads(raw.decode('utf-8'))
+            cursor = {'pk': int(pk), 'reverse': bool(reverse), 'value': None}
+            if self.field:
+                cursor['value'] = self._field_for(queryset).to_python(value)
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        value = None
+        if self.field:
+            value = getattr(row, self.field)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+        raw = json.dumps([value, row.pk, reverse]).encode('utf-8')
+        encoded = base64.urlsafe_b64encode(raw).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # stepped past the end: the first page is the best way back
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,192 @@
+"""
+Pluggable full-text search for posts and comments.
+
+Backends (picked by database vendor, or forced with POSTS_SEARCH_BACKEND):
+  - SQLiteFTS5Backend: FTS5 virtual tables (created by migration 0005) kept
+    in sync by posts.signals; `manage.py rebuild_search_index` refills them
+  - PostgresSearchBackend: tsvector / ts_rank / ts_headline computed by
+    Postgres, matched through the GIN expression indexes of migration 0008
+  - ContainsSearchBackend: the old LIKE '%term%' scan, for anything else
+
+`search()` filters a queryset to the matches and annotates `search_rank`
+(higher is better) and `search_snippet`. Backends mark matches in the
+snippet with private-use sentinels; `render_snippet()` HTML-escapes the
+post text and only then turns the sentinels into <b>...</b>, so the only
+markup in a snippet is the highlighting.
+"""
+import html
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Comment, Post
+
+# model -> (FTS table, indexed columns)
+INDEXES = {
+    Post: ('posts_post_fts', ('title', 'content')),
+    Comment: ('posts_comment_fts', ('content',)),
+}
+
+SNIPPET_TOKENS = 16
+# match markers: Unicode private-use characters, which html.escape() leaves alone
+MATCH_START, MATCH_END = '\ue000', '\ue001'
+
+
+def to_fts_query(term):
+    """
+    Turn free text into a safe FTS5 query: every word quoted (so user input
+    cannot inject FTS operators) and prefix-matched, all words required.
+    """
+    words = [word.replace('"', '""') for word in term.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+
+def tsvector_sql(columns, config='english', table=None):
+    """
+    `to_tsvector(...)` over `columns` as SQL. Migration 0008 indexes this
+    expression (unqualified), and Postgres only uses that index for a query
+    that repeats it exactly, so the query must be built here too.
+    """
+    prefix = f'"{table}".' if table else ''
+    document = " || ' ' || ".join(f"coalesce({prefix}\"{column}\", '')" for column in columns)
+    return f"to_tsvector('{config}', {document})"
+
+
+class SearchBackend:
+    def search(self, queryset, term):
+        raise NotImplementedError
+
+    def index(self, instance):
+        """Add or refresh one object in the index."""
+
+    def remove(self, instance):
+        """Drop one object from the index."""
+
+    def rebuild(self, model):
+        """Re-index every row of `model`; returns the number of rows indexed."""
+        return 0
+
+
+class ContainsSearchBackend(SearchBackend):
+    def search(self, queryset, term):
+        _, columns = INDEXES[queryset.model]
+        condition = Q()
+        for word in term.split():
+            word_condition = Q()
+            for column in columns:
+                word_condition |= Q(**{f'{column}__icontains': word})
+            condition &= word_condition
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=models.FloatField()),
+        )
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    def search(self, queryset, term):
+        table, columns = INDEXES[queryset.model]
+        match = to_fts_query(term)
+        if not match:
+            return queryset.none()
+        base = f'"{queryset.model._meta.db_table}"."id"'
+        matched = f'FROM {table} WHERE {table} MATCH %s'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid {matched}', [match]),
+        ).annotate(
+            # bm25() is lower-is-better; negate it so ranks sort descending
+            search_rank=RawSQL(
+                f'SELECT -bm25({table}) {matched} AND rowid = {base}', [match],
+                output_field=models.FloatField(),
+            ),
+            search_snippet=RawSQL(
+                f"SELECT snippet({table}, -1, %s, %s, '...', {SNIPPET_TOKENS}) {matched} AND rowid = {base}",
+                [MATCH_START, MATCH_END, match], output_field=models.TextField(),
+            ),
+        )
+
+    def index(self, instance):
+        table, columns = INDEXES[type(instance)]
+        values = [getattr(instance, column) for column in columns]
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES ({placeholders})',
+                [instance.pk] + values,
+            )
+
+    def remove(self, instance):
+        table, _ = INDEXES[type(instance)]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+
+    def rebuild(self, model):
+        table, columns = INDEXES[model]
+        column_list = ', '.join(columns)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {column_list}) '
+                f'SELECT id, {column_list} FROM {model._meta.db_table}'
+            )
+            return cursor.rowcount
+
+
+class PostgresSearchBackend(SearchBackend):
+    config = 'english'
+
+    def search(self, queryset, term):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVectorField
+
+        _, columns = INDEXES[queryset.model]
+        # not SearchVector(): its SQL (casts, a bound config) differs from the indexed expression
+        vector = RawSQL(
+            tsvector_sql(columns, self.config, queryset.model._meta.db_table), [],
+            output_field=SearchVectorField(),
+        )
+        query = SearchQuery(term, config=self.config, search_type='websearch')
+        document = columns[0] if len(columns) == 1 else Concat(
+            *[part for column in columns for part in (column, Value(' '))][:-1],
+            output_field=models.TextField(),
+        )
+        return queryset.annotate(search_vector=vector).filter(search_vector=query).annotate(
+            search_rank=SearchRank(vector, query),
+            search_snippet=SearchHeadline(
+                document, query, config=self.config,
+                start_sel=MATCH_START, stop_sel=MATCH_END, max_words=SNIPPET_TOKENS,
+            ),
+        )
+
+
+def render_snippet(snippet):
+    """A backend's snippet as safe HTML: the text escaped, matches in <b>...</b>."""
+    return html.escape(snippet).replace(MATCH_START, '<b>').replace(MATCH_END, '</b>')
+
+
+def get_backend():
+    path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return ContainsSearchBackend()
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter: same `?search=` parameter, but
+    answered by the full-text backend. Results carry `search_rank`, which
+    KeysetPagination uses to order pages by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        return get_backend().search(queryset, term)
@@ -1,40 +1,88 @@
+from django.conf import settings
 from rest_framework import serializers
+
+from accounts.serializers import UserSummarySerializer
+from social_media_api.fieldsets import SparseFieldsetMixin
 from .models import Post, Comment
+from .search import render_snippet
+
+
+class SearchSnippetMixin:
+    """Adds `search_snippet` to objects that came back from a full-text search."""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        snippet = getattr(instance, 'search_snippet', None)
+        if snippet is not None:
+            data['search_snippet'] = render_snippet(snippet)
+        return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsetMixin, SearchSnippetMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+        expandable_fields = {'author': UserSummarySerializer}
 
+    def validate_post(self, post):
+        # moving a comment would leave both posts' comments_count wrong
+        if self.instance is not None and post.pk != self.instance.post_id:
+            raise serializers.ValidationError('A comment cannot be moved to another post.')
+        return post
 
-class PostSerializer(serializers.ModelSerializer):
+
+class PostSerializer(SparseFieldsetMixin, SearchSnippetMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
+    comments_preview = serializers.SerializerMethodField()
     liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
             'id', 'author', 'title', 'content',
-            'created_at', 'updated_at', 'comments', 'comments_count'
-            'likes_count', 'liked'
+            'created_at', 'updated_at', 'comments_preview', 'comments_count',
+            'likes_count', 'views_count', 'liked'
+        ]
+        read_only_fields = [
+            'id', 'author', 'created_at', 'updated_at', 'comments_preview',
+            'comments_count', 'likes_count', 'views_count', 'liked',
         ]
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'comments', 'comments_count', 'likes_count', 'liked']
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-    
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
+        expandable_fields = {'author': UserSummarySerializer}
+
+    # comments_count / likes_count are plain columns on Post. `liked` and
+    # `comments_preview` are precomputed by Post.objects.with_stats(); the
+    # queries are only a fallback for un-annotated instances (e.g. the
+    # response to a create). Full threads live at posts/<pk>/comments/.
+
+    def get_comments_preview(self, obj):
+        preview = getattr(obj, 'comments_preview', None)
+        if preview is None:
+            size = getattr(settings, 'COMMENTS_PREVIEW_SIZE', 3)
+            preview = obj.comments.select_related('author').order_by('-created_at', '-id')[:size]
+        return CommentSerializer(preview, many=True, context=self.context).data
+
     def get_liked(self, obj):
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         request = self.context.get('request', None)
         if request and getattr(request, 'user', None) and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
         return False
+
+
+# largest value of a BigAutoField primary key
+MAX_ID = 2 ** 63 - 1
+MAX_LIKE_SYNC_OPERATIONS = 500
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+    action = serializers.ChoiceField(choices=['like', 'unlike'])
+
+
+class LikeSyncSerializer(serializers.Serializer):
+    """Body of POST /api/posts/likes/sync/."""
+    operations = LikeOperationSerializer(many=True, max_length=MAX_LIKE_SYNC_OPERATIONS)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Post
+from .search import get_backend
+
+
+# Keep the full-text index (posts.search) in step with posts and comments.
+# Queryset .update()/.bulk_create() skip these; run `rebuild_search_index` after bulk loads.
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_for_search(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def remove_from_search(sender, instance, **kwargs):
+    get_backend().remove(instance)
@@ -1,32 +1,859 @@
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
-from .models import Post
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, models
+from django.http import StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from . import cache as response_cache
+from . import counters
+from . import search
+from accounts.authentication import token_cache
+from rest_framework.authtoken.models import Token
+from social_media_api.perf import PerformanceMiddleware
+from social_media_api.testing import QueryBudgetMixin
+from .models import Comment, Like, Post, TimelineEntry
 from django.utils import timezone
+from io import StringIO
+import importlib
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+from notifications.models import NotificationOutbox
 
 User = get_user_model()
 
 class FeedTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.u1 = User.objects.create_user(username='u1', password='pass')
         self.u2 = User.objects.create_user(username='u2', password='pass')
         self.u3 = User.objects.create_user(username='u3', password='pass')
 
-        # u1 follows u2 only
-        self.u1.following.add(self.u2)
-
         # create posts: older first, then newer
         self.p_old = Post.objects.create(author=self.u2, content='old post')
         self.p_new = Post.objects.create(author=self.u2, content='new post')
+        Post.objects.create(author=self.u3, content='u3 post')
 
         self.client = APIClient()
         self.client.force_authenticate(user=self.u1)
 
+        # u1 follows u2 only (backfills u2's posts into u1's timeline)
+        self.client.post(f'/api/accounts/follow/{self.u2.id}/')
+
     def test_feed_returns_posts_from_followed_users_ordered(self):
         resp = self.client.get('/api/posts/feed/')
         self.assertEqual(resp.status_code, 200)
-        data = resp.json()
+        data = resp.json()['results']
         # newest should be first
         self.assertEqual(data[0]['content'], 'new post')
         self.assertEqual(data[1]['content'], 'old post')
         # posts from u3 (not followed) should not be present
+        self.assertEqual(len(data), 2)
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        author = APIClient()
+        author.force_authenticate(user=self.u2)
+        author.post('/api/posts/posts/', {'title': 't', 'content': 'fresh post'})
+
+        self.assertEqual(TimelineEntry.objects.filter(user=self.u1).count(), 3)
+        data = self.client.get('/api/posts/feed/').json()['results']
+        self.assertEqual(data[0]['content'], 'fresh post')
+
+    def test_unfollow_prunes_timeline(self):
+        self.client.post(f'/api/accounts/unfollow/{self.u2.id}/')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.u1).exists())
+        self.assertEqual(self.client.get('/api/posts/feed/').json()['results'], [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_author_is_read_on_demand(self):
+        self.client.post(f'/api/accounts/follow/{self.u3.id}/')
+        # u3 is over the threshold: nothing materialized, still in the feed
+        self.assertFalse(TimelineEntry.objects.filter(user=self.u1, post__author=self.u3).exists())
+        contents = [p['content'] for p in self.client.get('/api/posts/feed/').json()['results']]
+        self.assertIn('u3 post', contents)
+
+    def test_pages_merge_timeline_and_large_authors(self):
+        # u3 is over the fan-out threshold, u2 is materialized
+        User.objects.filter(pk=self.u3.pk).update(followers_count=10 ** 6)
+        self.client.post(f'/api/accounts/follow/{self.u3.id}/')
+        for i in range(12):
+            self.client.force_authenticate(user=self.u2)
+            self.client.post('/api/posts/posts/', {'title': 't', 'content': f'u2 {i}'})
+            Post.objects.create(author=self.u3, content=f'u3 {i}')
+        self.client.force_authenticate(user=self.u1)
+        # identical timestamps exercise the id tie-breaker across both sides
+        now = timezone.now()
+        Post.objects.update(created_at=now)
+        TimelineEntry.objects.update(post_created_at=now)
+        expected = list(
+            Post.objects.filter(author__in=[self.u2, self.u3]).order_by('-created_at', '-id').values_list('pk', flat=True)
+        )
+
+        seen, pages, url = [], [], '/api/posts/feed/?page_size=5&fields=id'
+        while url:
+            body = self.client.get(url).json()
+            pages.append(body)
+            seen += [post['id'] for post in body['results']]
+            url = body['next']
+        self.assertEqual(seen, expected)
+        back = self.client.get(pages[2]['previous']).json()
+        self.assertEqual([post['id'] for post in back['results']], expected[5:10])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass')
+        author = User.objects.create_user(username='writer', password='pass')
+        # identical timestamps exercise the id tie-breaker
+        now = timezone.now()
+        Post.objects.bulk_create([
+            Post(author=author, title=f'p{i}', content=f'post {i}') for i in range(25)
+        ])
+        Post.objects.update(created_at=now)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_walks_every_post_once_without_count_queries(self):
+        seen = []
+        url = '/api/posts/posts/?page_size=10'
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                body = self.client.get(url).json()
+                self.assertNotIn('count', body)
+                seen.extend(p['title'] for p in body['results'])
+                url = body['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        post_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "posts_post"' in q['sql']]
+        self.assertFalse(any('"__count"' in sql or 'OFFSET' in sql for sql in post_queries))
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get('/api/posts/posts/?page_size=10').json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+
+    def test_invalid_cursor_is_404(self):
+        resp = self.client.get('/api/posts/posts/?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 404)
+
+
+class PostQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f'/api/accounts/follow/{self._make_author().id}/')
+
+    def _make_author(self):
+        self.author = User.objects.create_user(username='writer', password='pass')
+        return self.author
+
+    def _add_posts(self, n):
+        for i in range(n):
+            post = Post.objects.create(author=self.author, title=f't{i}', content='c')
+            TimelineEntry.objects.create(user=self.user, post=post, post_created_at=post.created_at)
+            Comment.objects.create(post=post, author=self.user, content='hi')
+            Comment.objects.create(post=post, author=self.author, content='hello')
+            Like.objects.create(post=post, user=self.user)
+        # rows were written directly, so bring the counters back in line
+        call_command('sync_post_counters', stdout=StringIO())
+
+    def _queries_for(self, url):
+        cache.clear()  # measure the database path, not the response cache
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp.json()
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for url in ('/api/posts/posts/', '/api/posts/feed/'):
+            self._add_posts(1)
+            small, _ = self._queries_for(url)
+            self._add_posts(9)
+            large, body = self._queries_for(url)
+            self.assertEqual(small, large, url)
+            first = body['results'][0]
+            self.assertEqual(first['comments_count'], 2)
+            self.assertEqual(first['likes_count'], 1)
+            self.assertTrue(first['liked'])
+            Post.objects.all().delete()
+
+
+class PostCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.u1 = User.objects.create_user(username='u1', password='pass')
+        self.u2 = User.objects.create_user(username='u2', password='pass')
+        self.post = Post.objects.create(author=self.u2, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.u1)
+
+    def test_like_and_comment_paths_maintain_counters(self):
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        resp = self.client.post('/api/posts/comments/', {'post': self.post.pk, 'content': 'nice'})
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+
+        self.client.post(f'/api/posts/posts/{self.post.pk}/unlike/')
+        self.client.delete(f"/api/posts/comments/{resp.json()['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_comment_cannot_move_to_another_post(self):
+        other = Post.objects.create(author=self.u1, title='o', content='c')
+        comment = self.client.post('/api/posts/comments/', {'post': self.post.pk, 'content': 'nice'}).json()
+        resp = self.client.patch(f"/api/posts/comments/{comment['id']}/", {'post': other.pk}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.patch(f"/api/posts/comments/{comment['id']}/", {'post': self.post.pk, 'content': 'edited'},
+                                 format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Comment.objects.get(pk=comment['id']).post_id, self.post.pk)
+        self.assertEqual(Post.objects.get(pk=other.pk).comments_count, 0)
+
+    def test_sync_command_repairs_drift(self):
+        Like.objects.create(user=self.u1, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('sync_post_counters', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+        self.assertIn('1 repaired', out.getvalue())
+
+
+@override_settings(COMMENTS_PREVIEW_SIZE=2)
+class CommentPreviewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u1', password='pass')
+        self.post = Post.objects.create(author=self.user, title='t', content='c')
+        for i in range(5):
+            Comment.objects.create(post=self.post, author=self.user, content=f'comment {i}')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_embeds_only_latest_comments(self):
+        post = self.client.get('/api/posts/posts/').json()['results'][0]
+        self.assertNotIn('comments', post)
+        self.assertEqual([c['content'] for c in post['comments_preview']], ['comment 4', 'comment 3'])
+
+    def test_comment_thread_endpoint_is_cursor_paginated(self):
+        url = f'/api/posts/posts/{self.post.pk}/comments/?page_size=3'
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get(first['next']).json()
+        self.assertEqual([c['content'] for c in second['results']], ['comment 1', 'comment 0'])
+        self.assertIsNone(second['next'])
+
+    def test_comment_thread_for_missing_post_is_404(self):
+        self.assertEqual(self.client.get('/api/posts/posts/999/comments/').status_code, 404)
+        self.assertEqual(self.client.get('/api/posts/posts/abc/comments/').status_code, 404)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+
+    def test_repeat_reads_are_served_from_cache(self):
+        for url in ('/api/posts/feed/', '/api/posts/posts/'):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(any('posts_post' in q['sql'] for q in ctx.captured_queries), url)
+        stats = response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get('/api/posts/feed/')
+        self.client.get('/api/posts/posts/')
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+
+        for url in ('/api/posts/feed/', '/api/posts/posts/'):
+            post = self.client.get(url).json()['results'][0]
+            self.assertEqual(post['likes_count'], 1, url)
+            self.assertTrue(post['liked'], url)
+
+    def test_unfollow_invalidates_feed(self):
+        self.client.get('/api/posts/feed/')
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.assertEqual(self.client.get('/api/posts/feed/').json()['results'], [])
+
+    def test_fan_out_invalidates_followers_feeds(self):
+        self.client.get('/api/posts/feed/')
+        author = APIClient()
+        author.force_authenticate(user=self.author)
+        author.post('/api/posts/posts/', {'title': 'n', 'content': 'newest'})
+        self.assertEqual(self.client.get('/api/posts/feed/').json()['results'][0]['content'], 'newest')
+
+    def test_revalidation_cost_does_not_grow_with_follows(self):
+        def stamps_read():
+            etag = self.client.get('/api/posts/feed/')['ETag']
+            with mock.patch.object(response_cache, 'get_versions', wraps=response_cache.get_versions) as spy:
+                self.assertEqual(self.client.get('/api/posts/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            return sum(len(call.args[0]) for call in spy.call_args_list)
+
+        before = stamps_read()
+        for i in range(20):
+            other = User.objects.create_user(username=f'other{i}', password='pass')
+            self.client.post(f'/api/accounts/follow/{other.id}/')
+        self.assertEqual(stamps_read(), before)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+
+    def urls(self):
+        return ('/api/posts/feed/', '/api/posts/posts/', f'/api/posts/posts/{self.post.pk}/')
+
+    def test_non_numeric_pk_is_404(self):
+        for url in ('/api/posts/posts/abc/', '/api/posts/comments/abc/'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_matching_etag_is_not_modified(self):
+        for url in self.urls():
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200, url)
+            self.assertIn('no-cache', resp['Cache-Control'], url)
+            etag = resp['ETag']
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304, url)
+            self.assertEqual(resp['ETag'], etag, url)
+            self.assertFalse(resp.content, url)
+            self.assertFalse(any('posts_comment' in q['sql'] for q in ctx.captured_queries), url)
+
+    def test_not_modified_does_not_count_a_view(self):
+        url = f'/api/posts/posts/{self.post.pk}/'
+        buffered = {'ENABLED': True, 'FLUSH_INTERVAL': 0, 'JOURNAL_DIR': tempfile.mkdtemp()}
+        with override_settings(POST_COUNTER_BUFFER=buffered):
+            with self.captureOnCommitCallbacks(execute=True):
+                etag = self.client.get(url)['ETag']
+                self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            counters.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 1)
+
+    def test_like_changes_every_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        for url, etag in etags.items():
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200, url)
+            self.assertNotEqual(resp['ETag'], etag, url)
+
+    def test_new_post_changes_feed_and_list_etags(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()[:2]}
+        author = APIClient()
+        author.force_authenticate(user=self.author)
+        author.post('/api/posts/posts/', {'title': 'new', 'content': 'c'}, format='json')
+        for url, etag in etags.items():
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200, url)
+            self.assertEqual(len(resp.json()['results']), 2, url)
+
+    def test_etags_are_per_user(self):
+        other = APIClient()
+        other.force_authenticate(user=self.author)
+        for url in self.urls()[1:]:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        Comment.objects.create(post=self.post, author=self.reader, content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+
+    def test_fields_narrow_response_and_query(self):
+        for url in ('/api/posts/feed/?fields=id,title', '/api/posts/posts/?fields=id,title'):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url)
+            self.assertEqual(resp.json()['results'], [{'id': self.post.pk, 'title': 't'}], url)
+            sql = '\n'.join(q['sql'] for q in ctx.captured_queries)
+            self.assertNotIn('posts_comment', sql, url)
+            self.assertNotIn('posts_like', sql, url)
+            self.assertNotIn('"posts_post"."content"', sql, url)
+            self.assertNotIn('accounts_user"."bio', sql, url)
+
+    def test_default_representation_is_unchanged(self):
+        post = self.client.get('/api/posts/posts/').json()['results'][0]
+        self.assertEqual(post['author'], 'writer')
+        self.assertEqual(len(post['comments_preview']), 1)
+        self.assertIn('liked', post)
+
+    def test_expand_author(self):
+        resp = self.client.get(f'/api/posts/posts/{self.post.pk}/?fields=id,author&expand=author')
+        author = resp.json()['author']
+        self.assertEqual(author['username'], 'writer')
+        self.assertEqual(author['id'], self.author.pk)
+        self.assertEqual(set(resp.json()), {'id', 'author'})
+
+    def test_comment_fields_and_expand(self):
+        for url in ('/api/posts/comments/', f'/api/posts/posts/{self.post.pk}/comments/'):
+            comment = self.client.get(url + '?fields=content,author&expand=author').json()['results'][0]
+            self.assertEqual(comment, {'content': 'hi', 'author': comment['author']}, url)
+            self.assertEqual(comment['author']['username'], 'reader', url)
+
+    def test_writes_return_the_full_representation(self):
+        resp = self.client.post('/api/posts/posts/?fields=id', {'title': 'new', 'content': 'c'}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertIn('comments_preview', resp.json())
+
+    def test_detail_etag_depends_on_fieldset(self):
+        url = f'/api/posts/posts/{self.post.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        Comment.objects.create(post=self.post, author=self.reader, content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        self.token = Token.objects.create(user=self.reader)
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_same_payload_as_sync_feed(self):
+        for query in ('', '?fields=id,title', '?expand=author'):
+            sync = self.client.get('/api/posts/feed/' + query).json()
+            resp = self.client.get('/api/posts/async/feed/' + query)
+            self.assertEqual(resp.status_code, 200, query)
+            self.assertEqual(resp.json()['results'], sync['results'], query)
+
+    async def test_runs_on_the_event_loop(self):
+        client = AsyncClient()
+        auth = {'Authorization': f'Token {self.token.key}'}
+        resp = await client.get('/api/posts/async/feed/', headers=auth)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['results'][0]['comments_preview'][0]['content'], 'hi')
+        etag = resp['ETag']
+        resp = await client.get('/api/posts/async/feed/', headers={**auth, 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+
+    async def test_cache_goes_through_the_async_api(self):
+        client = AsyncClient()
+        auth = {'Authorization': f'Token {self.token.key}'}
+        sync_helpers = [mock.patch.object(response_cache, name, side_effect=AssertionError(name))
+                        for name in ('get_versions', 'get_feed_page', 'set_feed_page', '_count')]
+        for patcher in sync_helpers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for _ in range(2):
+            resp = await client.get('/api/posts/async/feed/', headers=auth)
+            self.assertEqual(resp.status_code, 200)
+
+    def test_cursor_pagination(self):
+        Post.objects.bulk_create([Post(author=self.author, title=f'p{i}', content='c') for i in range(12)])
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=self.reader, post=post, post_created_at=post.created_at)
+            for post in Post.objects.exclude(pk=self.post.pk)
+        ])
+        first = self.client.get('/api/posts/async/feed/').json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 13)
+        self.assertEqual(self.client.get('/api/posts/async/feed/?cursor=junk').status_code, 404)
+
+    def test_authentication_and_methods(self):
+        anonymous = APIClient()
+        resp = anonymous.get('/api/posts/async/feed/')
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(resp['WWW-Authenticate'], 'Token')
+        anonymous.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(anonymous.get('/api/posts/async/feed/').status_code, 401)
+        self.assertEqual(self.client.post('/api/posts/async/feed/').status_code, 405)
+
+
+class FullTextSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u1', password='pass')
+        self.weak = Post.objects.create(author=self.user, title='Weekend', content='Went hiking, then a long lunch.')
+        self.strong = Post.objects.create(author=self.user, title='Hiking guide', content='Hiking boots and hiking poles.')
+        Post.objects.create(author=self.user, title='Cooking', content='Pasta tonight.')
+        self.comment = Comment.objects.create(post=self.weak, author=self.user, content='Which hiking trail?')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, url):
+        cache.clear()  # rows below are edited directly, bypassing cache invalidation
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()['results']
+
+    def test_results_are_ranked_with_snippets(self):
+        results = self._search('/api/posts/posts/?search=hiking')
+        self.assertEqual([p['id'] for p in results], [self.strong.pk, self.weak.pk])
+        self.assertIn('<b>', results[0]['search_snippet'])
+
+    def test_snippet_escapes_post_markup(self):
+        Post.objects.create(author=self.user, title='Markup', content='hello <script>alert(1)</script> world')
+        snippet = self._search('/api/posts/posts/?search=hello')[0]['search_snippet']
+        self.assertEqual(snippet, '<b>hello</b> &lt;script&gt;alert(1)&lt;/script&gt; world')
+
+    def test_postgres_query_repeats_the_indexed_expression(self):
+        migration = importlib.import_module('posts.migrations.0008_search_gin_index')
+        indexed = {table: migration.tsvector_sql(columns) for table, columns in migration.GIN_INDEXES.values()}
+        for model, (_, columns) in search.INDEXES.items():
+            self.assertEqual(search.tsvector_sql(columns, search.PostgresSearchBackend.config),
+                             indexed[model._meta.db_table])
+
+    def test_prefix_match_and_operator_characters_are_safe(self):
+        self.assertEqual(len(self._search('/api/posts/posts/?search=hik')), 2)
+        # FTS operators in user input are treated as plain words, not syntax
+        self.assertEqual(self._search('/api/posts/posts/?search=%22hiking%20OR%20('), [])
+        self.assertEqual(len(self._search('/api/posts/posts/?search=hiking%22')), 2)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.strong.title = 'Camping guide'
+        self.strong.content = 'Tents.'
+        self.strong.save()
+        self.assertEqual([p['id'] for p in self._search('/api/posts/posts/?search=hiking')], [self.weak.pk])
+        self.weak.delete()
+        self.assertEqual(self._search('/api/posts/posts/?search=hiking'), [])
+
+    def test_comment_search_and_rebuild(self):
+        self.assertEqual([c['id'] for c in self._search('/api/posts/comments/?search=trail')], [self.comment.pk])
+        Comment.objects.filter(pk=self.comment.pk).update(content='Which river?')  # bypasses signals
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('/api/posts/comments/?search=trail'), [])
+
+    def test_ranked_results_page_with_cursor(self):
+        for i in range(4):
+            Post.objects.create(author=self.user, title=f'hiking {i}', content='hiking')
+        first = self.client.get('/api/posts/posts/?search=hiking&page_size=3').json()
+        second = self.client.get(first['next']).json()
+        ids = [p['id'] for p in first['results'] + second['results']]
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+
+
+class LikeWriteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.fan = User.objects.create_user(username='fan', password='pass')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        self.other = Post.objects.create(author=self.author, content='world')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_is_a_single_conditional_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertEqual(resp.status_code, 200)
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO posts_like')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')
+                          and 'FROM "posts_like"' in q['sql']])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(NotificationOutbox.objects.filter(recipient=self.author).count(), 1)
+
+    def test_refusals_are_explained(self):
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertEqual(self.client.post(f'/api/posts/posts/{self.post.pk}/like/').json()['detail'], 'Already liked.')
+        self.assertEqual(self.client.post('/api/posts/posts/999999/like/').status_code, 404)
+        self.client.force_authenticate(user=self.author)
+        resp = self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertEqual(resp.json()['detail'], 'Cannot like your own post.')
+        self.assertEqual(self.client.post(f'/api/posts/posts/{self.post.pk}/unlike/').status_code, 400)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_sync_applies_the_last_operation_per_post(self):
+        Like.objects.create(user=self.fan, post=self.other)
+        Post.objects.filter(pk=self.other.pk).update(likes_count=1)
+        resp = self.client.post('/api/posts/likes/sync/', {'operations': [
+            {'post': self.post.pk, 'action': 'like'},
+            {'post': self.post.pk, 'action': 'unlike'},
+            {'post': self.post.pk, 'action': 'like'},
+            {'post': self.other.pk, 'action': 'unlike'},
+            {'post': 999999, 'action': 'like'},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {'liked': [self.post.pk], 'unliked': [self.other.pk]})
+        counts = dict(Post.objects.values_list('pk', 'likes_count'))
+        self.assertEqual((counts[self.post.pk], counts[self.other.pk]), (1, 0))
+        self.assertEqual(list(Like.objects.filter(user=self.fan).values_list('post_id', flat=True)), [self.post.pk])
+
+    def test_sync_rejects_malformed_operations(self):
+        for operation in ({'post': 'x', 'action': 'like'}, {'post': 2 ** 70, 'action': 'like'},
+                          {'post': True, 'action': 'like'}, {'post': self.post.pk, 'action': 'love'}):
+            resp = self.client.post('/api/posts/likes/sync/', {'operations': [operation]}, format='json')
+            self.assertEqual(resp.status_code, 400, operation)
+        resp = self.client.post('/api/posts/likes/sync/', {'operations': [{'post': 1, 'action': 'like'}] * 501}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+
+class BufferedCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.journal_dir = tempfile.mkdtemp()
+        self.buffered = override_settings(POST_COUNTER_BUFFER={
+            'ENABLED': True, 'FLUSH_INTERVAL': 0, 'MAX_PENDING': 1000, 'JOURNAL_DIR': self.journal_dir,
+        })
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.fan = User.objects.create_user(username='fan', password='pass')
+        self.post = Post.objects.create(author=self.author, content='viral')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.fan)
+
+    def _counts(self):
+        self.post.refresh_from_db()
+        return self.post.views_count, self.post.likes_count
+
+    def test_views_are_not_written_when_disabled(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/api/posts/posts/{self.post.pk}/')
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in ctx.captured_queries))
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertEqual(self._counts(), (0, 1))
+        self.assertEqual(counters.stats(), {'enabled': False})
+
+    def test_increments_are_buffered_and_flushed_in_one_update(self):
+        with self.buffered:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    self.client.get(f'/api/posts/posts/{self.post.pk}/')
+                self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+            self.assertEqual(self._counts(), (0, 0))
+            self.assertEqual(counters.stats()['pending_increments'], 4)
+
+            with CaptureQueriesContext(connection) as ctx:
+                counters.flush()
+            updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+            self.assertEqual(len(updates), 1)
+            self.assertEqual(self._counts(), (3, 1))
+            stats = counters.stats()
+            self.assertEqual((stats['pending_increments'], stats['flushes'], stats['flush_lag']), (0, 1, 0.0))
+
+    def test_orphaned_journal_is_replayed_on_start(self):
+        # left behind by a worker that died before flushing
+        with open(os.path.join(self.journal_dir, 'counters-99999.jsonl'), 'w') as fh:
+            fh.write(json.dumps([self.post.pk, 'views_count', 5]) + '\n')
+            fh.write(json.dumps([self.post.pk, 'likes_count', 2]) + '\n')
+            fh.write('[1, "views_co')  # torn write
+        with self.buffered:
+            counters.get_buffer()
+            self.assertEqual(self._counts(), (5, 2))
+            self.assertFalse(os.path.exists(os.path.join(self.journal_dir, 'counters-99999.jsonl')))
+
+    def test_sync_command_leaves_pending_increments_to_the_flush(self):
+        with self.buffered:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+            out = StringIO()
+            call_command('sync_post_counters', stdout=out)
+            self.assertIn('0 repaired', out.getvalue())
+            counters.flush()
+            self.assertEqual(self._counts(), (0, 1))
+
+
+class SeedLoadTests(APITestCase):
+    def test_seed_load_builds_a_consistent_dataset(self):
+        out = StringIO()
+        call_command('seed_load', users=30, posts=60, follows_per_user=5, stdout=out)
+        self.assertIn('Created 30 users', out.getvalue())
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        # denormalized counters were rebuilt after bulk_create
+        self.assertEqual(sum(Post.objects.values_list('likes_count', flat=True)), Like.objects.count())
+        self.assertEqual(sum(User.objects.values_list('followers_count', flat=True)),
+                         sum(User.objects.values_list('following_count', flat=True)))
+        self.assertFalse(Like.objects.filter(user=models.F('post__author')).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+
+class PostQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every posts endpoint costs the same number of queries for 1 or 100 rows."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        self.post = Post.objects.create(author=self.author, title='anchor', content='budget anchor')
+
+    def _posts(self, n):
+        posts = Post.objects.bulk_create(
+            [Post(author=self.author, title=f'budget {i}', content='budget text') for i in range(n)]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=self.reader, post=post, post_created_at=post.created_at) for post in posts]
+        )
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.reader, content='hi') for post in posts]
+            + [Comment(post=post, author=self.author, content='hello') for post in posts]
+        )
+        Like.objects.bulk_create([Like(post=post, user=self.reader) for post in posts])
+        call_command('sync_post_counters', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        return posts
+
+    def _comments(self, n):
+        return Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.reader, content=f'comment {i}') for i in range(n)]
+        )
+
+    def _likers(self, n):
+        users = User.objects.bulk_create([User(username=f'liker{i}') for i in range(n)])
+        Like.objects.bulk_create([Like(post=self.post, user=user) for user in users])
+
+    def test_feed(self):
+        self.assertQueryBudget(4, self._posts, lambda posts: self.client.get('/api/posts/feed/'))
+
+    def test_post_list(self):
+        self.assertQueryBudget(2, self._posts, lambda posts: self.client.get('/api/posts/posts/'))
+
+    def test_feed_sparse_fieldset(self):
+        # graph reads + one narrow page query: no comments prefetch, `liked` subquery or author join
+        self.assertQueryBudget(3, self._posts, lambda posts: self.client.get('/api/posts/feed/?fields=id,title'))
+
+    def test_post_list_expanded_author(self):
+        self.assertQueryBudget(
+            2, self._posts, lambda posts: self.client.get('/api/posts/posts/?fields=id,author&expand=author'))
+
+    def test_post_search(self):
+        self.assertQueryBudget(2, self._posts, lambda posts: self.client.get('/api/posts/posts/?search=budget'))
+
+    def test_post_detail(self):
+        # no views_count UPDATE: views are only counted through the counter buffer
+        self.assertQueryBudget(4, self._comments, lambda comments: self.client.get(f'/api/posts/posts/{self.post.pk}/'))
+
+    def test_post_comments(self):
+        self.assertQueryBudget(
+            2, self._comments, lambda comments: self.client.get(f'/api/posts/posts/{self.post.pk}/comments/')
+        )
+
+    def test_comment_list(self):
+        self.assertQueryBudget(1, self._comments, lambda comments: self.client.get('/api/posts/comments/'))
+
+    def test_comment_detail(self):
+        self.assertQueryBudget(
+            1, self._comments, lambda comments: self.client.get(f'/api/posts/comments/{comments[0].pk}/')
+        )
+
+    def test_create_comment(self):
+        self.assertQueryBudget(
+            7, self._comments,
+            lambda comments: self.client.post('/api/posts/comments/', {'post': self.post.pk, 'content': 'new'}),
+        )
+
+    def test_like_and_unlike(self):
+        self.assertQueryBudget(5, self._likers, lambda: self.client.post(f'/api/posts/posts/{self.post.pk}/like/'))
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertQueryBudget(4, self._likers, lambda: self.client.post(f'/api/posts/posts/{self.post.pk}/unlike/'))
+
+    def test_like_sync(self):
+        def request(posts):
+            operations = [{'post': post.pk, 'action': 'like'} for post in posts]
+            return self.client.post('/api/posts/likes/sync/', {'operations': operations}, format='json')
+        self.assertQueryBudget(5, lambda n: Post.objects.bulk_create(
+            [Post(author=self.author, title=f'sync {i}', content='c') for i in range(n)]
+        ), request)
+
+
+class PerformanceMiddlewareTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u1', password='pass')
+        Post.objects.create(author=self.user, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_header(self):
+        resp = self.client.get('/api/posts/posts/')
+        metrics = dict(part.strip().split(';', 1) for part in resp['Server-Timing'].split(','))
+        self.assertEqual(set(metrics), {'total', 'db', 'dup', 'render', 'app'})
+        self.assertIn('queries', metrics['db'])
+
+    def test_sampled_request_logs_queries_with_origin(self):
+        with override_settings(PERF_MIDDLEWARE={'SAMPLE_RATE': 1.0}), self.assertLogs('perf', 'INFO') as logs:
+            self.client.get('/api/posts/posts/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertTrue(entry['sampled'])
+        self.assertEqual(entry['queries'], len(entry['query_log']))
+        self.assertTrue(any(q['origin'] and q['origin'].startswith('posts') for q in entry['query_log']))
+        self.assertTrue(all('stack' in q for q in entry['query_log']))
+
+    def test_slow_request_is_a_warning(self):
+        with override_settings(PERF_MIDDLEWARE={'SLOW_REQUEST_MS': 0}), self.assertLogs('perf', 'WARNING') as logs:
+            self.client.get('/api/posts/posts/')
+        entry = logs.records[0].perf
+        self.assertTrue(entry['slow'])
+        self.assertIn('query_log', entry)
+        self.assertNotIn('stack', entry['query_log'][0])
+        self.assertTrue(all(q['origin'] is None for q in entry['query_log']))
+
+    def test_query_origins_for_unsampled_requests_are_opt_in(self):
+        options = {'SLOW_REQUEST_MS': 0, 'QUERY_ORIGINS': True}
+        with override_settings(PERF_MIDDLEWARE=options), self.assertLogs('perf', 'WARNING') as logs:
+            self.client.get('/api/posts/posts/')
+        entry = logs.records[0].perf
+        self.assertFalse(entry['sampled'])
+        self.assertTrue(any(q['origin'] and q['origin'].startswith('posts') for q in entry['query_log']))
+
+    def test_streaming_response_is_logged_after_the_body(self):
+        def view(request):
+            def body():
+                yield str(User.objects.count()).encode()
+                yield str(Post.objects.count()).encode()
+            return StreamingHttpResponse(body())
+
+        response = PerformanceMiddleware(view)(RequestFactory().get('/stream/'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        with self.assertLogs('perf', 'INFO') as logs:
+            self.assertEqual(b''.join(response.streaming_content), b'11')
+        self.assertEqual(logs.records[0].perf['queries'], 2)
+
+    def test_long_stream_is_not_slow(self):
+        def view(request):
+            def body():
+                time.sleep(0.05)
+                yield b'event'
+            return StreamingHttpResponse(body())
 
+        with override_settings(PERF_MIDDLEWARE={'SLOW_REQUEST_MS': 20}):
+            response = PerformanceMiddleware(view)(RequestFactory().get('/stream/'))
+            with self.assertLogs('perf', 'INFO') as logs:
+                b''.join(response.streaming_content)
+        entry = logs.records[0].perf
+        self.assertGreaterEqual(entry['total_ms'], 50)
+        self.assertFalse(entry['slow'])
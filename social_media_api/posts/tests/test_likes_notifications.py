@@ -2,6 +2,7 @@ from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from posts.models import Post, Like
 from notifications.models import Notification
+from notifications.utils import process_outbox
 
 User = get_user_model()
 
@@ -19,7 +20,8 @@ class LikesNotificationsTests(APITestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertTrue(Like.objects.filter(user=self.u1, post=self.post).exists())
 
-        # Notification created for post author
+        # Notification queued for post author, delivered by the outbox worker
+        process_outbox()
         self.assertTrue(Notification.objects.filter(recipient=self.u2, actor=self.u1, verb__icontains='liked').exists())
 
     def test_unlike_removes_like(self):
@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.db.models import Q
+
+from accounts import graph
+from . import cache as response_cache
+from .models import Post, TimelineEntry
+from .pagination import KeysetPagination
+
+BATCH_SIZE = 1000
+
+
+def fanout_max_followers():
+    """
+    Authors with more followers than this are not fanned out on write;
+    their posts are merged into followers' feeds at read time instead.
+    """
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def backfill_limit():
+    """How many of an author's most recent posts are copied in on follow."""
+    return getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+
+def is_large_author(author):
+    return author.followers_count > fanout_max_followers()
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """
+    Push a freshly created post into the timeline of every follower of its author.
+    Returns the number of followers written to (0 for large authors).
+    """
+    if is_large_author(post.author):
+        return 0
+
+    written = 0
+    entries = []
+    follower_ids = graph.followers_queryset(post.author_id).values_list('to_user_id', flat=True)
+    for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+        entries.append(TimelineEntry(user_id=follower_id, post=post, post_created_at=post.created_at))
+        if len(entries) >= BATCH_SIZE:
+            _write_batch(entries)
+            written += len(entries)
+            entries = []
+    if entries:
+        _write_batch(entries)
+        written += len(entries)
+    return written
+
+
+def _write_batch(entries):
+    _bulk_insert(entries)
+    # the followers' cached feed pages no longer hold their newest post
+    response_cache.invalidate_feeds([entry.user_id for entry in entries])
+
+
+def backfill_timeline(user, author):
+    """
+    Copy the author's recent posts into `user`'s timeline after a follow.
+    Large authors are read on demand, so nothing is copied for them.
+    """
+    if is_large_author(author):
+        return 0
+
+    recent = author.posts.order_by('-created_at', '-id').values_list('pk', 'created_at')[:backfill_limit()]
+    entries = [
+        TimelineEntry(user=user, post_id=post_id, post_created_at=created_at)
+        for post_id, created_at in recent
+    ]
+    _bulk_insert(entries)
+    return len(entries)
+
+
+def prune_timeline(user, author):
+    """Drop the author's posts from `user`'s timeline after an unfollow."""
+    deleted, _ = TimelineEntry.objects.filter(user=user, post__author=author).delete()
+    return deleted
+
+
+def large_followed_author_ids(user):
+    """Ids of the accounts `user` follows that are above the fan-out threshold."""
+    return graph.large_following_ids(user.pk, fanout_max_followers())
+
+
+async def alarge_followed_author_ids(user):
+    return await graph.alarge_following_ids(user.pk, fanout_max_followers())
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Pages of `user`'s home feed, keyed like every other post list on
+    (created_at, id). The page is cut before any post is read: one range of
+    timeline_user_recent_idx over the copied (post_created_at, post_id), plus
+    (fan-out-on-read) one range of post_author_recent_idx per large followed
+    author. Only those page_size + 1 candidates per range are loaded from
+    the posts table and merged, so page 10,000 costs the same as page 1.
+
+    Async callers pass `large_ids` from alarge_followed_author_ids().
+    """
+
+    def __init__(self, user, large_ids=None):
+        self.user = user
+        self.large_ids = large_ids
+
+    def get_page_queryset(self, queryset):
+        limit = self.page_size + 1
+        entries = self.keyset(TimelineEntry.objects.filter(user=self.user), 'post_created_at', 'post_id')
+        candidates = Q(pk__in=entries.values('post_id')[:limit])
+
+        large_ids = self.large_ids
+        if large_ids is None:
+            large_ids = large_followed_author_ids(self.user)
+        for author_id in large_ids:
+            recent = self.keyset(Post.objects.filter(author_id=author_id), 'created_at')
+            candidates |= Q(pk__in=recent.values('pk')[:limit])
+
+        return super().get_page_queryset(queryset.filter(candidates))
@@ -1,6 +1,7 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import PostViewSet, CommentViewSet, feed, like_post, unlike_post
+from . import async_views
+from .views import PostViewSet, CommentViewSet, cache_stats, counter_stats, feed, like_post, unlike_post, sync_likes
 
 app_name = 'posts'
 
@@ -10,8 +11,12 @@ router.register(r'comments', CommentViewSet, basename='comment')
 
 urlpatterns = [
     path('feed/', feed, name='feed'),
+    path('async/feed/', async_views.feed, name='feed-async'),
+    path('cache-stats/', cache_stats, name='cache-stats'),
+    path('counter-stats/', counter_stats, name='counter-stats'),
     path('posts/<int:pk>/like/', like_post, name='post-like'),
     path('posts/<int:pk>/unlike/', unlike_post, name='post-unlike'),
+    path('likes/sync/', sync_likes, name='likes-sync'),
     path('', include(router.urls)),
 ]
 
@@ -1,61 +1,170 @@
-from rest_framework import viewsets, permissions, filters
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import viewsets, permissions
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import generics, status
 
+from . import cache as response_cache
+from . import counters, likes
 from .models import Post, Like, Comment
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import PostSerializer, CommentSerializer, LikeSyncSerializer
+from .pagination import KeysetPagination
 from .permissions import IsOwnerOrReadOnly
+from .search import FullTextSearchFilter
+from .timeline import FeedPagination, fan_out_post, large_followed_author_ids
 
-from notifications.utils import create_notification
-from django.shortcuts import get_object_or_404
+from social_media_api.fieldsets import SparseFieldsetViewMixin, fieldset_kwargs, narrow_queryset
+from django.db import transaction
+from django.http import Http404
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     CRUD for Post.
     - list, retrieve open to all (IsAuthenticatedOrReadOnly)
     - create requires authentication and sets author = request.user
     - update/delete allowed only for the post author (IsOwnerOrReadOnly)
-    - supports search by title/content and pagination
+    - supports full-text search by title/content (?search=, ranked, with
+      snippets) and cursor pagination (newest first)
+    - reads accept ?fields= and ?expand=author (see social_media_api.fieldsets)
     """
-    queryset = Post.objects.all().order_by('-created_at')
+    queryset = Post.objects.all().order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'content']  # search/filter capability
-    ordering_fields = ['created_at', 'updated_at']
+    pagination_class = KeysetPagination
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['title', 'content']  # indexed by posts.search
+    # _post_etag reads the row before get_object(); a non-numeric pk must 404 at the router
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        # counts, `liked` and comments are loaded in bulk (no per-post queries);
+        # a sparse fieldset only loads what it renders
+        serializer = self.get_serializer()
+        queryset = Post.objects.with_stats(self.request.user, fields=serializer.fields)
+        return narrow_queryset(queryset, serializer, always=['created_at']).order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        # served from the versioned response cache (see posts.cache); the
+        # page's version stamp is also its ETag
+        version = response_cache.post_list_version(request)
+        etag = response_cache.make_etag('posts', version)
+        unchanged = response_cache.not_modified(request, etag)
+        if unchanged is not None:
+            return response_cache.set_validators(unchanged, etag)
+        key = response_cache.post_list_cache_key(request, version)
+        data = response_cache.get_response(key)
+        if data is not None:
+            return response_cache.set_validators(Response(data), etag)
+        response = super().list(request, *args, **kwargs)
+        response_cache.set_response(key, response.data)
+        return response_cache.set_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self._post_etag(request, kwargs['pk'])
+        unchanged = response_cache.not_modified(request, etag)
+        if unchanged is not None:
+            return response_cache.set_validators(unchanged, etag)
+        response = super().retrieve(request, *args, **kwargs)
+        counters.incr(int(kwargs['pk']), 'views_count')  # revalidations (304) are not views
+        return response_cache.set_validators(response, etag)
+
+    def _post_etag(self, request, pk):
+        """
+        Validator for one post, from a single narrow row read: the post's own
+        columns plus its author's version stamp (bumped by likes, unlikes and
+        comment changes, which also move `liked` and comments_preview). Weak,
+        because views_count is left out on purpose: every view would change it.
+        """
+        row = (
+            Post.objects.filter(pk=pk)
+            .values_list('updated_at', 'likes_count', 'comments_count', 'author_id')
+            .first()
+        )
+        if row is None:
+            raise Http404
+        author_key = response_cache.author_version_key(row[3])
+        version = response_cache.get_versions([author_key])[author_key]
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        return response_cache.make_etag(
+            'post', pk, *row, version, user_id, request.get_full_path(), weak=True,
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
-
-
-class CommentViewSet(viewsets.ModelViewSet):
+        post = serializer.save(author=self.request.user)
+        # fan-out-on-write: push the new post into followers' timelines
+        fan_out_post(post)
+        response_cache.invalidate_author(post.author_id)
+
+    def perform_update(self, serializer):
+        post = serializer.save()
+        response_cache.invalidate_author(post.author_id)
+
+    def perform_destroy(self, instance):
+        author_id = instance.author_id
+        instance.delete()
+        response_cache.invalidate_author(author_id)
+
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """
+        GET /api/posts/posts/<pk>/comments/
+        The full comment thread of one post, newest first, cursor paginated.
+        (List responses only embed `comments_preview`.)
+        """
+        # DRF's get_object_or_404 also turns a malformed pk (ValueError) into a 404
+        post = generics.get_object_or_404(Post.objects.only('pk'), pk=pk)
+        fieldset = fieldset_kwargs(request)
+        context = self.get_serializer_context()
+        comments = _comment_queryset(CommentSerializer(context=context, **fieldset)).filter(post=post)
+        page = self.paginate_queryset(comments)
+        serializer = CommentSerializer(page, many=True, context=context, **fieldset)
+        return self.get_paginated_response(serializer.data)
+
+
+def _comment_queryset(serializer):
+    queryset = Comment.objects.order_by('-created_at', '-id')
+    if serializer.wants('author'):
+        queryset = queryset.select_related('author')
+    return narrow_queryset(queryset, serializer, always=['created_at'])
+
+
+class CommentViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     CRUD for Comment.
     - comment creation requires authentication and sets author = request.user
     - update/delete allowed only for the comment author
-    - pagination and optional search by content
+    - cursor pagination and optional full-text search by content
+    - reads accept ?fields= and ?expand=author
     """
-    queryset = Comment.objects.all().order_by('-created_at')
+    queryset = Comment.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['content']
-    ordering_fields = ['created_at', 'updated_at']
+    pagination_class = KeysetPagination
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['content']  # indexed by posts.search
+    lookup_value_regex = r'\d+'
 
+    def get_queryset(self):
+        return _comment_queryset(self.get_serializer())
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        Post.objects.filter(pk=comment.post_id).bump_counter('comments_count', 1)
+        response_cache.invalidate_author(comment.post.author_id)
+
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        response_cache.invalidate_author(comment.post.author_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post = instance.post
+        instance.delete()
+        Post.objects.filter(pk=post.pk).bump_counter('comments_count', -1)
+        response_cache.invalidate_author(post.author_id)
 
 
 # ---------------------
@@ -69,61 +178,113 @@ def feed(request):
     Returns posts from users that the current user follows,
     ordered by creation date (most recent first).
 
-    Uses User model's reverse related manager `following`:
-      - followers = ManyToManyField('self', related_name='following')
-      - therefore: request.user.following.all() returns users the request.user follows
+    Reads the user's materialized timeline (see posts.timeline) instead of
+    joining against `request.user.following`; posts by authors above
+    TIMELINE_FANOUT_MAX_FOLLOWERS are merged in at read time.
+
+    Paginated with an opaque cursor: follow `next` / `previous`.
+    Pages are served from the versioned response cache (see posts.cache),
+    and each cached page carries its ETag: If-None-Match -> 304.
+    Accepts ?fields= and ?expand=author (see social_media_api.fieldsets).
+    """
+    large_ids = large_followed_author_ids(request.user)
+    version = response_cache.feed_version(request, large_ids)
+    page = response_cache.get_feed_page(request, version)
+    if page is None:
+        paginator = FeedPagination(request.user, large_ids)
+        posts = paginator.paginate_queryset(feed_posts(request), request)
+        serializer = PostSerializer(posts, many=True, context={'request': request}, **fieldset_kwargs(request))
+        data = paginator.get_paginated_response(serializer.data).data
+        page = response_cache.set_feed_page(request, version, data, {post.author_id for post in posts})
+    unchanged = response_cache.not_modified(request, page['etag'])
+    if unchanged is not None:
+        return response_cache.set_validators(unchanged, page['etag'])
+    return response_cache.set_validators(Response(page['data']), page['etag'])
+
+
+def feed_posts(request):
+    """Posts loading what the request's fieldset renders; FeedPagination picks the page."""
+    wanted = PostSerializer(context={'request': request}, **fieldset_kwargs(request))
+    queryset = Post.objects.with_stats(request.user, fields=wanted.fields)
+    # author_id keys the page's entry in the response cache
+    return narrow_queryset(queryset, wanted, always=['created_at', 'author'])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    GET /api/posts/cache-stats/
+    Hit/miss counters of the feed and post-list response cache (staff only).
     """
-    following_users = request.user.following.all()
-    posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-    serializer = PostSerializer(posts, many=True)
-    return Response(serializer.data)
+    return Response(response_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def counter_stats(request):
+    """
+    GET /api/posts/counter-stats/
+    State of this process's write-buffered counters (staff only); `flush_lag`
+    is the age in seconds of the oldest increment not yet in the database.
+    """
+    return Response(counters.stats())
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def like_post(request, pk):
     """
     POST /api/posts/posts/<int:pk>/like/
-    Creates a Like (if not exists) and generates a Notification for the post author.
+    Creates a Like (if not exists) and queues a Notification for the post author.
+
+    The happy path is one conditional INSERT (see posts.likes); the post is
+    only read back to explain a refusal.
     """
-    post = get_object_or_404(Post, pk=pk)
-    user = request.user
+    if likes.like(request.user, [pk]):
+        return Response({'detail': 'Post liked.'}, status=status.HTTP_200_OK)
 
-    if post.author == user:
+    author_id = Post.objects.filter(pk=pk).values_list('author_id', flat=True).first()
+    if author_id is None:
+        raise Http404
+    if author_id == request.user.pk:
         return Response({'detail': 'Cannot like your own post.'}, status=status.HTTP_400_BAD_REQUEST)
-
-    like, created = Like.objects.get_or_create(user=user, post=post)
-    if not created:
-        return Response({'detail': 'Already liked.'}, status=status.HTTP_400_BAD_REQUEST)
-
-    # create notification to post author (if not liking self)
-    if post.author != user:
-        create_notification(
-            recipient=post.author,
-            actor=user,
-            verb='liked your post',
-            target=post
-        )
-
-    return Response({'detail': 'Post liked.'}, status=status.HTTP_200_OK)
+    return Response({'detail': 'Already liked.'}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def unlike_post(request, pk):
     """
     POST /api/posts/posts/<int:pk>/unlike/
     Removes a Like (if exists). Does NOT delete historical notifications by default.
     """
-    post = get_object_or_404(Post, pk=pk)
-    user = request.user
+    if likes.unlike(request.user, [pk]):
+        return Response({'detail': 'Like removed.'}, status=status.HTTP_200_OK)
 
-    deleted, _ = Like.objects.filter(user=user, post=post).delete()
-    if not deleted:
-        return Response({'detail': 'Not liked yet.'}, status=status.HTTP_400_BAD_REQUEST)
+    generics.get_object_or_404(Post.objects.only('pk'), pk=pk)
+    return Response({'detail': 'Not liked yet.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # optional.
-    return Response({'detail': 'Like removed.'}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@transaction.atomic
+def sync_likes(request):
+    """
+    POST /api/posts/likes/sync/
+    Expects: { "operations": [{"post": 1, "action": "like"}, {"post": 2, "action": "unlike"}, ...] }
+    (at most MAX_LIKE_SYNC_OPERATIONS). Applies the whole batch in one
+    transaction (the last operation per post wins). Returns the posts whose
+    like state changed:
+      { "liked": [...], "unliked": [...] }
+    Operations that change nothing (already liked, own post, missing post)
+    are simply absent from the result.
+    """
+    serializer = LikeSyncSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response(likes.sync(request.user, serializer.validated_data['operations']))
 
 
 # ---------------------
@@ -0,0 +1,52 @@
+"""
+Plumbing for the async (ASGI-native) read endpoints.
+
+DRF views are synchronous: under ASGI every one of them occupies a worker
+thread for its whole duration. The hottest reads therefore also exist as
+plain Django coroutine views (posts.async_views, notifications.async_views)
+that run on the event loop and use the async ORM, so a process can hold
+thousands of slow clients without a thread each.
+
+`async_api_view` gives those views what DRF would: GET/HEAD only, token
+authentication (a cached token never leaves the event loop), a DRF Request
+for paginators and serializers, and JSON errors for APIExceptions.
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import ForcedAuthentication, Request
+
+from accounts.authentication import CachedTokenAuthentication
+
+ALLOWED_METHODS = ('GET', 'HEAD')
+
+
+def _error(exc, authenticator, request):
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return response
+
+
+def async_api_view(view):
+    """Decorate `async def view(request, ...)`; `request` is an authenticated DRF Request."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ALLOWED_METHODS:
+            response = JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            response['Allow'] = ', '.join(ALLOWED_METHODS)
+            return response
+        authenticator = CachedTokenAuthentication()
+        try:
+            auth = await authenticator.aauthenticate(request)
+            if auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user = auth[0]
+            drf_request = Request(request, authenticators=[ForcedAuthentication(*auth)])
+            return await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _error(exc, authenticator, request)
+
+    return wrapper
@@ -0,0 +1,102 @@
+"""
+Sparse fieldsets and opt-in expansion for API responses.
+
+    GET /api/posts/posts/?fields=id,title
+    GET /api/posts/feed/?fields=id,title,author&expand=author
+
+`fields` keeps only the named top-level fields; `expand` swaps a relation
+that is normally rendered as a string (a post's author, a notification's
+actor) for the nested object. Unknown names are ignored.
+
+Serializers opt in with SparseFieldsetMixin and list what can be expanded
+in Meta.expandable_fields; SerializerMethodFields declare the columns they
+read in Meta.field_sources. Views pass the parsed parameters on with
+fieldset_kwargs(request) (or SparseFieldsetViewMixin for generic views) and
+narrow their querysets with narrow_queryset(), so a lean request loads only
+the columns, joins and prefetches its fields need. Requests without either
+parameter are untouched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _names(request, param):
+    raw = request.query_params.get(param)
+    if raw is None:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+def fieldset_kwargs(request):
+    """Serializer kwargs for the request's ?fields= / ?expand= (empty if neither is given)."""
+    if request is None:
+        return {}
+    fields, expand = _names(request, FIELDS_PARAM), _names(request, EXPAND_PARAM)
+    if fields is None and not expand:
+        return {}
+    return {'fields': fields, 'expand': expand or set()}
+
+
+class SparseFieldsetMixin:
+    """
+    ModelSerializer mixin accepting `fields=` (names to keep, None for all)
+    and `expand=` (names from Meta.expandable_fields to render nested).
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset_requested = fields is not None or bool(expand)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand or ():
+            if name in expandable:
+                self.fields[name] = expandable[name](read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def wants(self, name):
+        return name in self.fields
+
+
+def requested_columns(serializer, always=()):
+    """
+    Model columns (only() names) the serializer's current fields read.
+    Expanded relations contribute `relation__column` for their own fields;
+    relations rendered with str() load the whole related row.
+    """
+    model = serializer.Meta.model
+    sources = getattr(serializer.Meta, 'field_sources', {})
+    columns = {model._meta.pk.name, *always}
+    for name, field in serializer.fields.items():
+        for source in sources.get(name, [field.source]):
+            try:
+                model_field = model._meta.get_field(source.split('.')[0])
+            except FieldDoesNotExist:
+                continue  # '*', properties, annotations
+            if not model_field.concrete or model_field.many_to_many:
+                continue
+            columns.add(model_field.name)
+            if model_field.is_relation and isinstance(field, serializers.ModelSerializer):
+                columns.update(f'{model_field.name}__{column}' for column in requested_columns(field))
+    return columns
+
+
+def narrow_queryset(queryset, serializer, always=()):
+    """only() the columns `serializer` reads, if the request asked for a fieldset."""
+    if not getattr(serializer, 'fieldset_requested', False):
+        return queryset
+    return queryset.only(*requested_columns(serializer, always))
+
+
+class SparseFieldsetViewMixin:
+    """GenericAPIView mixin: read requests get the ?fields= / ?expand= serializer."""
+
+    def get_serializer(self, *args, **kwargs):
+        # writes answer with the full representation
+        if self.request.method in SAFE_METHODS:
+            kwargs = {**fieldset_kwargs(self.request), **kwargs}
+        return super().get_serializer(*args, **kwargs)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,15 +51,52 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with an in-process LRU/TTL cache (accounts.authentication)
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# Token -> user cache used by CachedTokenAuthentication (per process).
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,  # seconds; bounds staleness across processes
+}
+
+# Home timeline (posts.timeline): authors with more followers than this are
+# merged into feeds at read time instead of being fanned out on write.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+# Number of an author's most recent posts copied into a timeline on follow.
+TIMELINE_BACKFILL_LIMIT = 200
+
+# Number of latest comments embedded per post in list/feed responses.
+COMMENTS_PREVIEW_SIZE = 3
+
+# Notification outbox (notifications.utils): failed deliveries are retried
+# with backoff up to this many times by `manage.py process_notification_outbox`.
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5
+# Likes/follows of the same (recipient, verb, target) within this many seconds
+# are coalesced into one notification keeping a few sample actors.
+NOTIFICATION_COALESCE_WINDOW = 3600
+NOTIFICATION_SAMPLE_ACTORS = 3
+# Server-sent events stream (notifications.stream); times in seconds.
+NOTIFICATION_STREAM = {
+    'HEARTBEAT': 15,
+    'POLL_INTERVAL': 5,  # database check when no in-process wake-up arrives
+    'MAX_DURATION': 300,
+}
+
+# Streaming NDJSON export (accounts.export): rows fetched per database round
+# trip, and bytes buffered per chunk written to the client.
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_BYTES = 64 * 1024
+
 
 MIDDLEWARE = [
+    # outermost, so it times the whole stack (Server-Timing header + `perf` log)
+    'social_media_api.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +106,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# One JSON line per request from social_media_api.perf.PerformanceMiddleware on the
+# `perf` logger: WARNING logs slow requests only, INFO logs every request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'perf': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'social_media_api.urls'
 
 TEMPLATES = [
@@ -89,13 +142,41 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection settings come from the environment (sqlite by default); see db.py.
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; in production point these at a shared backend, e.g.
+#   DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   DJANGO_CACHE_LOCATION=/var/tmp/social_media_api_cache
+# or
+#   DJANGO_CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+#   DJANGO_CACHE_LOCATION=127.0.0.1:11211
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'social-media-api'),
     }
 }
 
+# Versioned feed / post-list response cache (posts.cache).
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+
+# Write-buffered likes_count / views_count (posts.counters). Off by default:
+# likes then go straight to the database and views are not counted.
+POST_COUNTER_BUFFER = {
+    'ENABLED': os.environ.get('POST_COUNTER_BUFFER', '') == '1',
+    'FLUSH_INTERVAL': float(os.environ.get('POST_COUNTER_FLUSH_INTERVAL', 2.0)),  # seconds
+    'MAX_PENDING': int(os.environ.get('POST_COUNTER_MAX_PENDING', 1000)),  # increments
+    'JOURNAL_DIR': os.environ.get('POST_COUNTER_JOURNAL_DIR', str(BASE_DIR / 'var' / 'counters')),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators